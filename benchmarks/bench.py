@@ -0,0 +1,278 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for the prompt servers and Session Log operations.
+
+Suites:
+  startup      Cold start of each server module in a fresh interpreter.
+  prompts      `get_prompt` latency percentiles for every prompt, over the
+               in-memory fastmcp client, for arguments from 1 line to 1 MB.
+  throughput   `get_prompt` calls per second with N concurrent clients.
+  session-log  Appending to and tail-reading Session Logs of 100 to 100k
+               turns, against the read/concat/write protocol as a baseline.
+
+Results are written as JSON. Given a previous result file, the run fails
+(exit status 1) if any metric regressed by more than the threshold.
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --compare results.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "combined_server"))
+
+from startup_check import measure_startup  # noqa: E402
+
+SUITES = ("startup", "prompts", "throughput", "session-log")
+SERVER_DIRS = ("promptgen_server", "dynagent_server", "superagent_server")
+PROMPTS = ("promptgen", "dynagent", "superagent")
+
+ARG_SIZES = {"1line": 40, "1kb": 1024, "64kb": 64 * 1024, "1mb": 1024 * 1024}
+TURN_COUNTS = (100, 1_000, 10_000, 100_000)
+QUICK_TURN_COUNTS = (100, 1_000, 10_000)
+CLIENT_COUNTS = (1, 8, 32)
+
+_SAMPLE_TURN = (
+    "### Turn {n}: Specialist-{n}\n"
+    "**Status:** COMPLETED\n"
+    "**Prompt:** ~/tmp/gemini-tasks/repo/session/prompt-{n}-task-specialist.md\n"
+    "**Thought:** {filler}\n"
+    "**Action:** Edited `src/module_{n}.py`.\n"
+    "**Observation:** All checks passed.\n"
+    "**Summary:** Done.\n"
+)
+_LOG_HEADER = "# SuperAgent Session: bench\n\n## Master Plan\n\n- [ ] Step 1\n\n---\n\n## Agent Work Log\n\n"
+
+
+class Results:
+    def __init__(self):
+        self.metrics: dict[str, dict] = {}
+
+    def add(self, name: str, value: float, unit: str = "s", higher_is_better=False):
+        self.metrics[name] = {
+            "value": round(value, 9),
+            "unit": unit,
+            "higher_is_better": higher_is_better,
+        }
+        print(f"{name:60} {value:14.6f} {unit}", file=sys.stderr)
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        f"p{round(q * 100)}": ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        for q in (0.50, 0.95, 0.99)
+    }
+
+
+def bench_startup(results: Results, runs: int) -> None:
+    for name in (*SERVER_DIRS, "combined_server"):
+        report = measure_startup(ROOT / name, runs)
+        results.add(f"startup.{name}.median", report["median_seconds"])
+        results.add(f"startup.{name}.peak_rss", report["peak_rss_mib"], "MiB")
+
+
+async def bench_prompts(results: Results, iterations: int) -> None:
+    from fastmcp import Client
+    from main import mcp
+
+    async with Client(mcp) as client:
+        for prompt in PROMPTS:
+            for label, size in ARG_SIZES.items():
+                base = "x" * size
+                samples = []
+                for i in range(iterations):
+                    # A distinct argument per call, so renders are not cached.
+                    args = {"prompt": f"{i} {base}"}
+                    started = time.perf_counter()
+                    await client.get_prompt(prompt, args)
+                    samples.append(time.perf_counter() - started)
+                for stat, value in _percentiles(samples).items():
+                    results.add(f"prompts.{prompt}.{label}.{stat}", value)
+
+
+async def bench_throughput(results: Results, calls_per_client: int) -> None:
+    from fastmcp import Client
+    from main import mcp
+
+    async def client_run(client_id: int) -> None:
+        async with Client(mcp) as client:
+            for i in range(calls_per_client):
+                prompt = PROMPTS[i % len(PROMPTS)]
+                await client.get_prompt(prompt, {"prompt": f"{client_id}-{i}"})
+
+    for clients in CLIENT_COUNTS:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_run(c) for c in range(clients)))
+        elapsed = time.perf_counter() - started
+        results.add(
+            f"throughput.{clients}_clients",
+            clients * calls_per_client / elapsed,
+            "calls/s",
+            higher_is_better=True,
+        )
+
+
+def _write_log(path: str, turns: int) -> None:
+    filler = "Analysis of the current state. " * 8
+    with open(path, "w") as f:
+        f.write(_LOG_HEADER)
+        for n in range(1, turns + 1):
+            f.write(_SAMPLE_TURN.format(n=n, filler=filler) + "\n")
+
+
+def _baseline_append(path: str, entry: str) -> None:
+    """The read/concat/write protocol the prompts used to prescribe."""
+    with open(path) as f:
+        content = f.read()
+    with open(path, "w") as f:
+        f.write(content + entry)
+
+
+def _baseline_tail(path: str, last: int) -> list[str]:
+    with open(path) as f:
+        content = f.read()
+    return re.split(r"^(?=### Turn \d+:)", content, flags=re.MULTILINE)[-last:]
+
+
+async def bench_session_log(results: Results, turn_counts, iterations: int) -> None:
+    from gemini_cli_mcp.session_log import SessionLog, TurnEntry
+
+    entry = TurnEntry("Bench", "COMPLETED", "p.md", "t", "a", "o", "s")
+    with tempfile.TemporaryDirectory() as tmp:
+        for turns in turn_counts:
+            path = os.path.join(tmp, f"log-{turns}.md")
+            _write_log(path, turns)
+            log = SessionLog(path)
+            # The first call builds the turn index.
+            started = time.perf_counter()
+            await log.read_turns(last=5)
+            results.add(
+                f"session_log.{turns}.index_build", time.perf_counter() - started
+            )
+
+            cases = {
+                "append": lambda: log.append(entry),
+                "tail_read": lambda: log.read_turns(last=5),
+            }
+            for name, call in cases.items():
+                samples = []
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    await call()
+                    samples.append(time.perf_counter() - started)
+                results.add(f"session_log.{turns}.{name}", statistics.median(samples))
+
+            rendered = entry.render(turns + 1)
+            baselines = {
+                "baseline_append": lambda: _baseline_append(path, rendered),
+                "baseline_tail_read": lambda: _baseline_tail(path, 5),
+            }
+            for name, call in baselines.items():
+                samples = []
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    call()
+                    samples.append(time.perf_counter() - started)
+                results.add(f"session_log.{turns}.{name}", statistics.median(samples))
+
+
+def compare(current: dict, previous: dict, threshold: float) -> list[str]:
+    """Returns a description of every metric that regressed beyond `threshold`."""
+    regressions = []
+    for name, metric in current.items():
+        old = previous.get(name)
+        if old is None or not old["value"]:
+            continue
+        change = (metric["value"] - old["value"]) / old["value"]
+        if metric["higher_is_better"]:
+            change = -change
+        if change > threshold:
+            regressions.append(
+                f"{name}: {old['value']:.6g} -> {metric['value']:.6g} "
+                f"{metric['unit']} ({change:+.0%})"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split("\n\n", 1)[1],
+    )
+    parser.add_argument("--suite", action="append", choices=SUITES)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="A previous JSON result file.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed relative regression when comparing (default: 0.2).",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Fewer iterations and Session Logs of at most 10k turns.",
+    )
+    args = parser.parse_args()
+
+    suites = args.suite or SUITES
+    iterations = 20 if args.quick else 100
+    results = Results()
+    if "startup" in suites:
+        bench_startup(results, runs=3 if args.quick else 5)
+    if "prompts" in suites:
+        asyncio.run(bench_prompts(results, iterations))
+    if "throughput" in suites:
+        asyncio.run(bench_throughput(results, iterations))
+    if "session-log" in suites:
+        turn_counts = QUICK_TURN_COUNTS if args.quick else TURN_COUNTS
+        asyncio.run(bench_session_log(results, turn_counts, min(iterations, 20)))
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "suites": list(suites),
+        "metrics": results.metrics,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())["metrics"]
+        regressions = compare(results.metrics, previous, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Connects a stdio MCP client to the shared daemon, starting it if needed.
+
+Gemini CLI launches this script instead of the server itself. It reuses the
+daemon listening on the given address (see `daemon.py`), or starts one if
+none is running, then forwards each JSON-RPC message from stdin to the daemon,
+with the daemon's bearer token, and writes the responses to stdout. It imports
+only the standard library, so a session connects to a warm server in
+milliseconds instead of paying for a cold start.
+
+    python combined_server/connect.py [--socket PATH | --port 8765]
+"""
+
+import argparse
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from daemon import (
+    MCP_PATH,
+    Address,
+    add_address_arguments,
+    address_from_args,
+    auth_headers,
+    ensure_daemon,
+)
+
+# Requests are forwarded concurrently, so that a long-running tool call does
+# not hold up the rest of the session.
+_MAX_IN_FLIGHT = 32
+
+_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json, text/event-stream",
+}
+
+
+class Bridge:
+    """Forwards JSON-RPC messages between stdio and the daemon."""
+
+    def __init__(self, address: Address):
+        self.address = address
+        self.headers = {**_HEADERS, **auth_headers()}
+        self._write_lock = threading.Lock()
+
+    def write(self, message: dict | list) -> None:
+        line = json.dumps(message, separators=(",", ":"))
+        with self._write_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    def post(self, body: bytes) -> tuple[int, str, bytes]:
+        conn = self.address.connect()
+        try:
+            conn.request("POST", MCP_PATH, body=body, headers=self.headers)
+            response = conn.getresponse()
+            content_type = response.getheader("Content-Type", "")
+            return response.status, content_type, response.read()
+        finally:
+            conn.close()
+
+    def forward(self, line: str) -> None:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return
+        body = line.encode("utf-8")
+        try:
+            try:
+                status, content_type, payload = self.post(body)
+            except OSError:
+                # The daemon went away; start a new one and retry once.
+                ensure_daemon(self.address)
+                status, content_type, payload = self.post(body)
+        except Exception as e:
+            self.fail(message, f"MCP daemon unavailable: {e}")
+            return
+        if not payload:
+            return
+        if content_type.startswith("text/event-stream"):
+            for event_line in payload.decode("utf-8").splitlines():
+                if event_line.startswith("data:"):
+                    self.write(json.loads(event_line[5:]))
+        elif content_type.startswith("application/json"):
+            self.write(json.loads(payload))
+        else:
+            self.fail(message, f"MCP daemon returned HTTP {status}.")
+
+    def fail(self, message: dict | list, error: str) -> None:
+        """Answers every request in `message` with a JSON-RPC error."""
+        requests = message if isinstance(message, list) else [message]
+        for request in requests:
+            if isinstance(request, dict) and "id" in request:
+                self.write(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": request["id"],
+                        "error": {"code": -32603, "message": error},
+                    }
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    add_address_arguments(parser)
+    address = address_from_args(parser.parse_args())
+    ensure_daemon(address)
+
+    bridge = Bridge(address)
+    with ThreadPoolExecutor(max_workers=_MAX_IN_FLIGHT) as pool:
+        for line in sys.stdin:
+            if line.strip():
+                pool.submit(bridge.forward, line)
+
+
+if __name__ == "__main__":
+    main()
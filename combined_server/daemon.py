@@ -0,0 +1,285 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs the combined server as a long-lived daemon shared by many CLI sessions.
+
+The daemon serves MCP over streamable HTTP on a Unix socket in the private
+state directory, or on a localhost TCP port when one is given. It runs in
+stateless mode with plain JSON responses, so every request is independent and
+any number of clients can use it concurrently.
+
+Since its tools run `gemini` and reset git repositories with the privileges of
+whoever started it, every request except `/health` must carry the bearer
+token kept in `daemon.token` in the state directory (mode 0600), on either
+transport. `connect.py` sends it.
+
+    python combined_server/daemon.py serve [--socket PATH | --port 8765]
+    python combined_server/daemon.py ensure   # start one unless already running
+    python combined_server/daemon.py status
+    python combined_server/daemon.py stop
+    python combined_server/daemon.py profile  # toggle the sampling profiler
+
+The daemon also serves its request metrics in the Prometheus text format on
+`/metrics`.
+
+Only the `serve` command imports fastmcp; the rest of this module is standard
+library only so that `connect.py` can start quickly.
+"""
+
+import argparse
+import fcntl
+import hmac
+import http.client
+import json
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MCP_PATH = "/mcp"
+HEALTH_PATH = "/health"
+METRICS_PATH = "/metrics"
+
+STATE_DIR = Path(
+    os.environ.get("GEMINI_MCP_STATE_DIR", "~/.cache/gemini-cli-mcp-servers")
+).expanduser()
+
+DEFAULT_SOCKET = STATE_DIR / "mcp.sock"
+TOKEN_FILE = STATE_DIR / "daemon.token"
+
+DEFAULT_START_TIMEOUT = 30.0
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float | None):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+@dataclass(frozen=True)
+class Address:
+    """Where the daemon listens: a Unix socket or a localhost TCP port."""
+
+    host: str = DEFAULT_HOST
+    port: int = DEFAULT_PORT
+    socket: str | None = None
+
+    @property
+    def url(self) -> str:
+        if self.socket:
+            return f"unix:{self.socket}"
+        return f"http://{self.host}:{self.port}{MCP_PATH}"
+
+    def connect(self, timeout: float | None = None) -> http.client.HTTPConnection:
+        if self.socket:
+            return _UnixHTTPConnection(self.socket, timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+
+def add_address_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--host", help=f"Listen on TCP (default {DEFAULT_HOST}).")
+    parser.add_argument("--port", type=int, help=f"TCP port (default {DEFAULT_PORT}).")
+    parser.add_argument(
+        "--socket", help=f"Unix socket to listen on (default {DEFAULT_SOCKET})."
+    )
+
+
+def address_from_args(args: argparse.Namespace) -> Address:
+    if args.socket:
+        return Address(socket=os.path.expanduser(args.socket))
+    if args.host or args.port:
+        return Address(args.host or DEFAULT_HOST, args.port or DEFAULT_PORT)
+    return Address(socket=str(DEFAULT_SOCKET))
+
+
+def load_token() -> str:
+    """Returns the daemon's bearer token, creating it on first use."""
+    try:
+        return TOKEN_FILE.read_text().strip()
+    except FileNotFoundError:
+        pass
+    STATE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # Written in full to a private temporary file, then linked into place, so
+    # that racing callers all end up with the one token that won.
+    fd, scratch = tempfile.mkstemp(dir=STATE_DIR, prefix="daemon.token-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_urlsafe(32) + "\n")
+        try:
+            os.link(scratch, TOKEN_FILE)
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(scratch)
+    return TOKEN_FILE.read_text().strip()
+
+
+def auth_headers() -> dict[str, str]:
+    """Returns the headers that authenticate a request to the daemon."""
+    return {"Authorization": f"Bearer {load_token()}"}
+
+
+def health(address: Address, timeout: float = 1.0) -> dict | None:
+    """Returns the daemon's health report, or None if it is not reachable."""
+    try:
+        conn = address.connect(timeout)
+        try:
+            conn.request("GET", HEALTH_PATH)
+            response = conn.getresponse()
+            if response.status != 200:
+                return None
+            return json.loads(response.read())
+        finally:
+            conn.close()
+    except (OSError, ValueError, http.client.HTTPException):
+        return None
+
+
+def _state_file(address: Address, suffix: str) -> Path:
+    name = Path(address.socket).name if address.socket else f"{address.port}"
+    return STATE_DIR / f"daemon-{name}.{suffix}"
+
+
+def ensure_daemon(address: Address, timeout: float = DEFAULT_START_TIMEOUT) -> bool:
+    """
+    Makes sure a daemon is listening on `address`, starting one if needed.
+
+    Launchers racing each other are serialized with a lock file, so only one
+    daemon is ever started. Returns True if this call started the daemon.
+    """
+    if health(address) is not None:
+        return False
+    STATE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    with open(_state_file(address, "lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if health(address) is not None:
+            return False
+        command = [sys.executable, str(Path(__file__).resolve()), "serve"]
+        if address.socket:
+            command += ["--socket", address.socket]
+        else:
+            command += ["--host", address.host, "--port", str(address.port)]
+        with open(_state_file(address, "log"), "ab") as log:
+            subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=log,
+                start_new_session=True,
+            )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if health(address) is not None:
+                return True
+            time.sleep(0.05)
+    raise TimeoutError(f"The MCP daemon did not start on {address.url}.")
+
+
+def serve(address: Address) -> None:
+    """Serves the combined server on `address` until interrupted."""
+    import uvicorn
+    from main import mcp
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse, PlainTextResponse
+
+    from gemini_cli_mcp.metrics import METRICS
+
+    @mcp.custom_route(HEALTH_PATH, methods=["GET"])
+    async def report_health(request: Request) -> JSONResponse:
+        return JSONResponse({"status": "ok", "pid": os.getpid()})
+
+    @mcp.custom_route(METRICS_PATH, methods=["GET"])
+    async def report_metrics(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(
+            METRICS.prometheus(), media_type="text/plain; version=0.0.4"
+        )
+
+    if address.socket:
+        # A socket left behind by a daemon that died would make bind() fail.
+        if os.path.exists(address.socket) and health(address) is None:
+            os.unlink(address.socket)
+        Path(address.socket).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    app = mcp.http_app(path=MCP_PATH, json_response=True, stateless_http=True)
+    expected = f"Bearer {load_token()}".encode()
+
+    async def authenticated(scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["path"] != HEALTH_PATH:
+            given = dict(scope["headers"]).get(b"authorization", b"")
+            if not hmac.compare_digest(given, expected):
+                response = PlainTextResponse(
+                    "Unauthorized", 401, headers={"WWW-Authenticate": "Bearer"}
+                )
+                await response(scope, receive, send)
+                return
+        await app(scope, receive, send)
+
+    uvicorn.run(
+        authenticated,
+        host=address.host,
+        port=address.port,
+        uds=address.socket,
+        log_level="warning",
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "command", choices=("serve", "ensure", "status", "stop", "profile")
+    )
+    add_address_arguments(parser)
+    args = parser.parse_args()
+    address = address_from_args(args)
+
+    if args.command == "serve":
+        serve(address)
+    elif args.command == "ensure":
+        started = ensure_daemon(address)
+        print(f"{'Started' if started else 'Already running'}: {address.url}")
+    else:
+        report = health(address)
+        if report is None:
+            print(f"Not running: {address.url}")
+            return 1
+        if args.command == "stop":
+            os.kill(report["pid"], signal.SIGTERM)
+            print(f"Stopped: {address.url} (pid {report['pid']})")
+        elif args.command == "profile":
+            os.kill(report["pid"], signal.SIGUSR2)
+            print(
+                f"Toggled the profiler of {address.url} (pid {report['pid']}); "
+                "read it from the metrics://profile resource."
+            )
+        else:
+            print(f"Running: {address.url} (pid {report['pid']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
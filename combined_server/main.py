@@ -0,0 +1,59 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A single MCP server hosting the PromptGen, DynAgent and SuperAgent servers.
+
+Running the three servers separately costs three interpreter starts, three
+fastmcp/pydantic imports and three resident processes per Gemini CLI session
+(and per specialist that SuperAgent spawns). This server mounts all three
+without a prefix, so their prompts and tools keep their original names.
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+
+from fastmcp import FastMCP
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVERS = ("promptgen_server", "dynagent_server", "superagent_server")
+
+
+def load_server_module(name: str) -> ModuleType:
+    """
+    Imports `<name>/main.py` as the module `<name>_main`.
+
+    Each server's directory is put on `sys.path`, as `fastmcp run` does, so
+    that its sibling modules can be imported.
+    """
+    module_name = f"{name}_main"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    server_dir = ROOT / name
+    if str(server_dir) not in sys.path:
+        sys.path.append(str(server_dir))
+    spec = importlib.util.spec_from_file_location(module_name, server_dir / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+mcp = FastMCP("Gemini CLI MCP Servers")
+
+for name in SERVERS:
+    mcp.mount(load_server_module(name).mcp)
@@ -0,0 +1,101 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Checks the cold start of the combined server against a time budget.
+
+Each run starts a fresh interpreter, imports the server and lists its prompts
+and tools over an in-memory client, which is roughly what a Gemini CLI session
+pays before it can use the server. Exits with status 1 if the median run
+exceeds the budget.
+
+    python combined_server/startup_check.py --runs 5 --budget 3.0
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_BUDGET = 3.0
+DEFAULT_RUNS = 5
+
+_PROBE = """
+import asyncio, sys
+sys.path.insert(0, {server_dir!r})
+from fastmcp import Client
+from main import mcp
+
+async def probe():
+    async with Client(mcp) as client:
+        await client.list_prompts()
+        await client.list_tools()
+
+asyncio.run(probe())
+"""
+
+
+def measure_startup(server_dir: Path, runs: int) -> dict:
+    """
+    Returns the wall-clock times of `runs` cold starts of `server_dir/main.py`.
+
+    Also reports the peak resident memory of the probe processes, in MiB.
+    """
+    probe = _PROBE.format(server_dir=str(server_dir))
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", probe],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - started)
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "server": server_dir.name,
+        "runs": runs,
+        "median_seconds": round(statistics.median(times), 3),
+        "max_seconds": round(max(times), 3),
+        "peak_rss_mib": round(maxrss / scale, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        help="Maximum median startup time, in seconds.",
+    )
+    args = parser.parse_args()
+
+    result = measure_startup(Path(__file__).resolve().parent, args.runs)
+    result["budget_seconds"] = args.budget
+    result["within_budget"] = result["median_seconds"] <= args.budget
+    print(json.dumps(result, indent=2))
+    return 0 if result["within_budget"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Code shared by the PromptGen, DynAgent and SuperAgent servers: the Session
+Log tooling, specialist dispatch, prompt templates and metrics.
+
+The servers import it by its qualified name (`gemini_cli_mcp.<module>`), so
+it must be installed (see the README) rather than found next to a server.
+"""
@@ -0,0 +1,362 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Batched git checkpoints of the work done by specialists.
+
+A checkpoint commits only the paths a specialist reports it touched, on top of
+`HEAD`. Checkpoints requested within `DEFAULT_BATCH_WINDOW` seconds of each
+other are coalesced into a single commit.
+
+Commits are built with git plumbing rather than `git add`/`git commit`: a
+temporary index is loaded from `HEAD`, only the reported paths are hashed into
+it, and `write-tree`/`commit-tree` create the commit, which `update-ref` then
+moves `HEAD` to (compare-and-swap, retried if `HEAD` moved meanwhile). The
+whole working tree is never scanned, and whatever the user has staged in the
+real index is not swept into the commit.
+
+Named checkpoints are kept as `refs/checkpoints/<name>`. Rolling back to one
+is a `reset --hard`; uncommitted changes to tracked files are saved first as
+`refs/checkpoints/pre-rollback`.
+"""
+
+import asyncio
+import os
+import stat
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+
+GIT = "git"
+DEFAULT_BATCH_WINDOW = 0.5
+CHECKPOINT_REFS = "refs/checkpoints/"
+PRE_ROLLBACK = "pre-rollback"
+
+_NULL_SHA = "0" * 40
+_ATTEMPTS = 3
+
+
+class GitError(Exception):
+    """Raised when a git command fails."""
+
+
+def run_git(
+    cwd: str, *args: str, input: bytes | None = None, env: dict | None = None
+) -> str:
+    """Runs a git command in `cwd` and returns its output, or raises `GitError`."""
+    result = subprocess.run(
+        [GIT, *args],
+        cwd=cwd,
+        input=input,
+        capture_output=True,
+        env={**os.environ, **env} if env else None,
+    )
+    if result.returncode != 0:
+        message = result.stderr.decode("utf-8", errors="replace").strip()
+        raise GitError(f"git {args[0]} failed: {message}")
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def repo_root(path: str) -> str:
+    """Returns the top-level directory of the git repository containing `path`."""
+    path = os.path.abspath(os.path.expanduser(path))
+    if not os.path.isdir(path):
+        path = os.path.dirname(path)
+    return run_git(path, "rev-parse", "--show-toplevel").strip()
+
+
+def _ref(name: str) -> str:
+    ref = CHECKPOINT_REFS + name
+    if subprocess.run([GIT, "check-ref-format", ref]).returncode != 0:
+        raise ValueError(f"Invalid checkpoint name: {name!r}")
+    return ref
+
+
+@dataclass
+class _Request:
+    name: str | None
+    paths: list[str]
+    message: str
+    done: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+
+
+@dataclass
+class Checkpoint:
+    """The commit that recorded a batch of checkpoint requests."""
+
+    commit: str
+    names: list[str]
+    paths: list[str]
+    changed: bool
+    batched: int
+
+    def to_dict(self) -> dict:
+        return {
+            "commit": self.commit,
+            "names": self.names,
+            "paths": self.paths,
+            "changed": self.changed,
+            "batched": self.batched,
+        }
+
+
+class Repository:
+    """Creates and restores checkpoints in one git repository."""
+
+    def __init__(self, root: str, batch_window: float = DEFAULT_BATCH_WINDOW):
+        self.root = root
+        self.batch_window = batch_window
+        self._pending: list[_Request] = []
+        self._flush: asyncio.Task | None = None
+        # Batches are committed one at a time.
+        self._commit_lock = asyncio.Lock()
+
+    async def checkpoint(
+        self, paths: list[str], message: str, name: str | None = None
+    ) -> Checkpoint:
+        """
+        Commits `paths` as they are in the working tree, batched with any other
+        checkpoints requested in the same window. Deleted paths are removed.
+        """
+        if name is not None:
+            _ref(name)
+        request = _Request(name, [self._relative(path) for path in paths], message)
+        self._pending.append(request)
+        if self._flush is None:
+            self._flush = asyncio.create_task(self._flush_after_window())
+        return await request.done
+
+    def _relative(self, path: str) -> str:
+        absolute = os.path.normpath(os.path.join(self.root, os.path.expanduser(path)))
+        relative = os.path.relpath(absolute, self.root)
+        if relative == ".." or relative.startswith(".." + os.sep):
+            raise ValueError(f"Path is outside the repository: {path}")
+        return relative
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.batch_window)
+        batch, self._pending, self._flush = self._pending, [], None
+        async with self._commit_lock:
+            try:
+                result = await asyncio.to_thread(self._commit, batch)
+            except Exception as e:
+                for request in batch:
+                    # A caller that was cancelled has already given up.
+                    if not request.done.done():
+                        request.done.set_exception(e)
+                return
+        for request in batch:
+            if not request.done.done():
+                request.done.set_result(result)
+
+    def _commit(self, batch: list[_Request]) -> Checkpoint:
+        paths = sorted({path for request in batch for path in request.paths})
+        names = [request.name for request in batch if request.name]
+        message = "\n\n".join(request.message.strip() for request in batch)
+        if len(batch) > 1:
+            message = f"Checkpoint of {len(batch)} turns\n\n{message}"
+
+        for _ in range(_ATTEMPTS):
+            parent = self._head()
+            tree, entries = self._write_tree(parent, paths)
+            parent_tree = self._tree_of(parent) if parent else None
+            if tree == parent_tree:
+                commit, changed = parent, False
+                break
+            args = ["commit-tree", tree, "-F", "-"]
+            if parent:
+                args += ["-p", parent]
+            commit = run_git(self.root, *args, input=message.encode()).strip()
+            try:
+                run_git(
+                    self.root,
+                    "update-ref",
+                    "-m",
+                    f"checkpoint: {message.splitlines()[0]}",
+                    "HEAD",
+                    commit,
+                    parent or _NULL_SHA,
+                )
+            except GitError:
+                # HEAD moved since it was read; rebuild on top of the new one.
+                continue
+            changed = True
+            self._sync_index(entries)
+            break
+        else:
+            raise GitError("HEAD kept moving; the checkpoint was not recorded.")
+
+        for name in names:
+            run_git(self.root, "update-ref", _ref(name), commit)
+        return Checkpoint(commit, names, paths, changed, len(batch))
+
+    def _head(self) -> str | None:
+        try:
+            return run_git(
+                self.root, "rev-parse", "-q", "--verify", "HEAD^{commit}"
+            ).strip()
+        except GitError:
+            return None
+
+    def _tree_of(self, commit: str) -> str:
+        return run_git(self.root, "rev-parse", f"{commit}^{{tree}}").strip()
+
+    def _write_tree(self, parent: str | None, paths: list[str]) -> tuple[str, bytes]:
+        """
+        Returns the tree of `parent` with `paths` updated from the working tree,
+        and the `update-index --index-info` entries that were applied.
+        """
+        fd, index = tempfile.mkstemp(prefix="checkpoint-index-")
+        os.close(fd)
+        os.unlink(index)
+        env = {"GIT_INDEX_FILE": index}
+        try:
+            if parent:
+                run_git(self.root, "read-tree", parent, env=env)
+            else:
+                run_git(self.root, "read-tree", "--empty", env=env)
+            entries = self._entries(paths, env) if paths else b""
+            if entries:
+                run_git(
+                    self.root,
+                    "update-index",
+                    "-z",
+                    "--index-info",
+                    input=entries,
+                    env=env,
+                )
+            tree = run_git(self.root, "write-tree", env=env).strip()
+            return tree, entries
+        finally:
+            if os.path.exists(index):
+                os.unlink(index)
+
+    def _entries(self, paths: list[str], env: dict) -> bytes:
+        # The reported paths may be directories: expand them to the files git
+        # knows about or would add (tracked, or untracked and not ignored).
+        listed = run_git(
+            self.root,
+            "ls-files",
+            "-z",
+            "--cached",
+            "--others",
+            "--exclude-standard",
+            "--",
+            *paths,
+            env=env,
+        )
+        files = sorted({path for path in listed.split("\0") if path})
+        entries, regular = {}, []
+        for path in files:
+            full = os.path.join(self.root, path)
+            try:
+                st = os.lstat(full)
+            except FileNotFoundError:
+                entries[path] = f"0 {_NULL_SHA}"
+                continue
+            if stat.S_ISLNK(st.st_mode):
+                target = os.readlink(full).encode()
+                blob = run_git(self.root, "hash-object", "-w", "--stdin", input=target)
+                entries[path] = f"120000 {blob.strip()}"
+            elif stat.S_ISREG(st.st_mode):
+                regular.append(path)
+        if regular:
+            blobs = run_git(
+                self.root,
+                "hash-object",
+                "-w",
+                "--stdin-paths",
+                input="\n".join(regular).encode(),
+            ).split()
+            for path, blob in zip(regular, blobs):
+                executable = os.stat(os.path.join(self.root, path)).st_mode & 0o100
+                entries[path] = f"{'100755' if executable else '100644'} {blob}"
+        return "".join(
+            f"{entries[path]}\t{path}\0" for path in sorted(entries)
+        ).encode()
+
+    def _sync_index(self, entries: bytes) -> None:
+        """Updates the real index for the committed paths, so they show clean."""
+        if not entries:
+            return
+        try:
+            run_git(self.root, "update-index", "-z", "--index-info", input=entries)
+        except GitError:
+            # The index is locked by another git command. The commit stands;
+            # `git status` will just show the paths as changed until refreshed.
+            pass
+
+    def list(self) -> list[dict]:
+        """Returns the named checkpoints, most recent first."""
+        output = run_git(
+            self.root,
+            "for-each-ref",
+            "--sort=-committerdate",
+            "--format=%(refname)%00%(objectname)%00%(committerdate:iso-strict)"
+            "%00%(contents:subject)",
+            CHECKPOINT_REFS,
+        )
+        checkpoints = []
+        for line in output.splitlines():
+            ref, commit, date, subject = line.split("\0", 3)
+            checkpoints.append(
+                {
+                    "name": ref.removeprefix(CHECKPOINT_REFS),
+                    "commit": commit,
+                    "date": date,
+                    "subject": subject,
+                }
+            )
+        return checkpoints
+
+    def rollback(self, name: str) -> dict:
+        """
+        Resets `HEAD`, the index and the working tree to checkpoint `name`.
+
+        Uncommitted changes to tracked files are first saved as the
+        `pre-rollback` checkpoint. Untracked files are left alone.
+        """
+        ref = _ref(name)
+        try:
+            target = run_git(self.root, "rev-parse", "--verify", f"{ref}^{{commit}}")
+        except GitError:
+            raise ValueError(f"No checkpoint named {name!r}.")
+        target = target.strip()
+        previous = self._head()
+        saved = run_git(
+            self.root, "stash", "create", f"Before rollback to {name}"
+        ).strip()
+        if saved:
+            run_git(self.root, "update-ref", _ref(PRE_ROLLBACK), saved)
+        run_git(self.root, "reset", "-q", "--hard", target)
+        return {
+            "name": name,
+            "commit": target,
+            "previous_head": previous,
+            "saved_changes": saved or None,
+        }
+
+
+_repositories: dict[str, Repository] = {}
+
+
+def open_repository(path: str) -> Repository:
+    """Returns the shared `Repository` for the git repository containing `path`."""
+    root = repo_root(path)
+    repository = _repositories.get(root)
+    if repository is None:
+        repository = _repositories[root] = Repository(root)
+    return repository
@@ -0,0 +1,515 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Rolling compaction of the `Agent Work Log`.
+
+Compaction moves `COMPLETED` turns out of the live Session Log, so that what
+agents read each turn stays bounded, without losing anything:
+
+1.  The turns are appended verbatim to the log's archive
+    (`<session log stem>.archive.md`), which is only ever appended to and is
+    itself a readable Session Log of those turns.
+2.  The turns are merged into the single rollup block of the
+    `## Compacted Turns` section just before the `## Agent Work Log`. The
+    rollup is extracted from the turns, not summarized, so it is
+    deterministic: the turn numbers, statuses and agents, the most recent
+    files mentioned in their actions and observations, the first line of the
+    most recent summaries, and a link to the archive. Its size is bounded no
+    matter how many turns it covers.
+3.  The folded turns are removed from the live log. The rest of the log is
+    written to a new file that is renamed over it, so a crash leaves either
+    the old log or the new one, never a mix.
+
+The most recent `window` turns, and every turn that is not `COMPLETED`, stay
+in the live log. If the log, rollup included, is still over its byte budget,
+older `COMPLETED` turns inside the window are folded too, oldest first. The
+last turn is always kept, so turn numbering continues.
+
+`schedule_compaction` runs a compaction in the background once a log grows
+past its budget. A log that compaction could not bring under its budget (too
+many turns that are not `COMPLETED`) is not compacted again until it has grown
+by a quarter, so appends do not each pay for rewriting it. The budget and
+window default to `GEMINI_SESSION_LOG_BUDGET` and `GEMINI_SESSION_LOG_WINDOW`;
+`GEMINI_SESSION_LOG_AUTO_COMPACT=0` turns the background compaction off.
+"""
+
+import asyncio
+import contextlib
+import os
+import re
+import stat
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, field
+
+from gemini_cli_mcp.session_log import TurnEntry, locked, resolve_path
+from gemini_cli_mcp.turn_index import STATUS_RE, TURN_HEADER_RE, TurnIndex
+
+DEFAULT_WINDOW = int(os.environ.get("GEMINI_SESSION_LOG_WINDOW", 10))
+DEFAULT_BUDGET = int(os.environ.get("GEMINI_SESSION_LOG_BUDGET", 128 * 1024))
+AUTO_COMPACT = os.environ.get("GEMINI_SESSION_LOG_AUTO_COMPACT", "1") != "0"
+
+ARCHIVE_SUFFIX = ".archive.md"
+ROLLUP_HEADING = "## Compacted Turns"
+
+MAX_FILES = 30
+MAX_OBSERVATIONS = 12
+MAX_LINE = 200
+
+_ROLLUP_RE = re.compile(rb"^## Compacted Turns[ \t]*$", re.MULTILINE)
+_WORK_LOG_RE = re.compile(rb"^## Agent Work Log[ \t]*$", re.MULTILINE)
+_BLOCK_RE = re.compile(rb"^### Compacted Turns\b", re.MULTILINE)
+_COVERED_RE = re.compile(r"^\*\*Archive:\*\* .*, turns ([\d, -]+)$", re.MULTILINE)
+_STATUSES_RE = re.compile(r"^\*\*Status:\*\* (.*)$", re.MULTILINE)
+_AGENTS_RE = re.compile(r"^\*\*Agents:\*\* (.*)$", re.MULTILINE)
+_FILES_RE = re.compile(r"^\*\*Files touched:\*\* (.*)$", re.MULTILINE)
+_MORE_RE = re.compile(r"\(\+(\d+) more\)")
+_OBSERVATION_RE = re.compile(r"^- Turn (\d+) \((.*?)\): (.*)$", re.MULTILINE)
+_EARLIER_RE = re.compile(r"^- \((\d+) earlier turns? in the archive\)$", re.MULTILINE)
+_BACKTICKED_RE = re.compile(r"`([^`\s]+)`")
+_BARE_PATH_RE = re.compile(r"(?<![\w/.:-])((?:[\w.-]+/)+[\w.-]+\.[A-Za-z0-9]+)\b")
+_FILE_NAME_RE = re.compile(r"^[\w./-]*[\w-]\.[A-Za-z0-9]{1,8}$")
+
+
+def archive_path(log_path: str) -> str:
+    """Returns the path of the archive holding a Session Log's compacted turns."""
+    root, _ = os.path.splitext(log_path)
+    return root + ARCHIVE_SUFFIX
+
+
+@dataclass
+class _Turn:
+    number: int
+    status: str | None
+    start: int
+    end: int
+    text: bytes
+
+    def entry(self) -> TurnEntry:
+        return TurnEntry.parse(self.text.decode("utf-8", errors="replace"))
+
+
+def _turns(data: bytes) -> list[_Turn]:
+    headers = list(TURN_HEADER_RE.finditer(data))
+    turns = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(data)
+        status = STATUS_RE.search(data, header.end(), end)
+        turns.append(
+            _Turn(
+                int(header.group(1)),
+                status.group(1).decode() if status else None,
+                header.start(),
+                end,
+                data[header.start() : end],
+            )
+        )
+    return turns
+
+
+def _ranges(numbers: list[int]) -> str:
+    """Formats turn numbers compactly, e.g. `1-3, 5, 7-9`."""
+    parts, start = [], None
+    for i, number in enumerate(numbers):
+        if start is None:
+            start = number
+        if i + 1 == len(numbers) or numbers[i + 1] != number + 1:
+            parts.append(str(start) if start == number else f"{start}-{number}")
+            start = None
+    return ", ".join(parts)
+
+
+def _parse_ranges(text: str) -> list[int]:
+    """Inverts `_ranges`."""
+    numbers = []
+    for part in text.split(","):
+        first, _, last = part.strip().partition("-")
+        numbers.extend(range(int(first), int(last or first) + 1))
+    return numbers
+
+
+def _first_line(text: str) -> str:
+    line = text.strip().split("\n", 1)[0].strip()
+    return line if len(line) <= MAX_LINE else line[: MAX_LINE - 3] + "..."
+
+
+def _files(entry: TurnEntry) -> list[str]:
+    """Returns the file paths mentioned in a turn's action and observation."""
+    seen: dict[str, None] = {}
+    for text in (entry.action, entry.observation):
+        for token in _BACKTICKED_RE.findall(text) + _BARE_PATH_RE.findall(text):
+            if "://" not in token and _FILE_NAME_RE.match(token):
+                seen.setdefault(token, None)
+    return list(seen)
+
+
+@dataclass
+class Rollup:
+    """
+    What the `## Compacted Turns` section records about the archived turns.
+
+    Only the most recent `MAX_FILES` files and `MAX_OBSERVATIONS` observations
+    are kept, so merging in more turns never makes it grow beyond that.
+    """
+
+    numbers: list[int] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    agents: Counter = field(default_factory=Counter)
+    files: list[str] = field(default_factory=list)
+    more_files: int = 0
+    # (turn number, agent, first line of the summary or observation)
+    observations: list[tuple[int, str, str]] = field(default_factory=list)
+    earlier: int = 0
+
+    @classmethod
+    def of(cls, turns: list[_Turn]) -> "Rollup":
+        rollup = cls()
+        for turn in turns:
+            entry = turn.entry()
+            rollup.numbers.append(turn.number)
+            rollup.statuses[turn.status or "UNKNOWN"] += 1
+            rollup.agents[entry.agent_id] += 1
+            rollup._add_files(_files(entry))
+            observation = entry.summary or entry.observation
+            rollup.observations.append(
+                (turn.number, entry.agent_id, _first_line(observation))
+            )
+        rollup._trim()
+        return rollup
+
+    @classmethod
+    def parse(cls, text: str) -> "Rollup":
+        """Reads back a block written by `render`."""
+        rollup = cls()
+        if covered := _COVERED_RE.search(text):
+            rollup.numbers = _parse_ranges(covered.group(1))
+        if statuses := _STATUSES_RE.search(text):
+            for part in statuses.group(1).split(", "):
+                count, _, status = part.partition(" ")
+                if count.isdigit():
+                    rollup.statuses[status] += int(count)
+        if agents := _AGENTS_RE.search(text):
+            for agent, count in re.findall(r"(.+?) \((\d+)\)(?:, |$)", agents.group(1)):
+                rollup.agents[agent] += int(count)
+        if files := _FILES_RE.search(text):
+            # Listed most recent first.
+            rollup.files = _BACKTICKED_RE.findall(files.group(1))[::-1]
+            if more := _MORE_RE.search(files.group(1)):
+                rollup.more_files = int(more.group(1))
+        rollup.observations = [
+            (int(number), agent, line)
+            for number, agent, line in _OBSERVATION_RE.findall(text)
+        ]
+        if earlier := _EARLIER_RE.search(text):
+            rollup.earlier = int(earlier.group(1))
+        return rollup
+
+    def merged(self, other: "Rollup") -> "Rollup":
+        """Returns this rollup with the turns of `other`, compacted later."""
+        rollup = Rollup(
+            sorted(set(self.numbers) | set(other.numbers)),
+            self.statuses + other.statuses,
+            self.agents + other.agents,
+            list(self.files),
+            self.more_files + other.more_files,
+            self.observations + other.observations,
+            self.earlier + other.earlier,
+        )
+        rollup._add_files(other.files)
+        rollup._trim()
+        return rollup
+
+    def _add_files(self, files: list[str]) -> None:
+        for path in files:
+            if path in self.files:
+                self.files.remove(path)
+            self.files.append(path)
+
+    def _trim(self) -> None:
+        if len(self.files) > MAX_FILES:
+            self.more_files += len(self.files) - MAX_FILES
+            del self.files[:-MAX_FILES]
+        if len(self.observations) > MAX_OBSERVATIONS:
+            self.earlier += len(self.observations) - MAX_OBSERVATIONS
+            del self.observations[:-MAX_OBSERVATIONS]
+
+    def render(self, archive_name: str) -> str:
+        numbers = self.numbers
+        lines = [
+            f"### Compacted Turns {numbers[0]}"
+            + (f"-{numbers[-1]}" if len(numbers) > 1 else ""),
+            f"**Archive:** [{archive_name}]({archive_name}), turns {_ranges(numbers)}",
+            "**Status:** "
+            + ", ".join(
+                f"{count} {status}" for status, count in sorted(self.statuses.items())
+            ),
+            "**Agents:** "
+            + ", ".join(
+                f"{agent} ({count})" for agent, count in self.agents.most_common()
+            ),
+        ]
+        if self.files:
+            # The most recent files are the most relevant to what comes next.
+            listed = ", ".join(f"`{path}`" for path in reversed(self.files))
+            if self.more_files:
+                listed += f" (+{self.more_files} more)"
+            lines.append(f"**Files touched:** {listed}")
+        lines.append("**Key observations:**")
+        if self.earlier:
+            lines.append(f"- ({self.earlier} earlier turns in the archive)")
+        for number, agent, line in self.observations:
+            lines.append(f"- Turn {number} ({agent}): {line}")
+        return "\n".join(lines) + "\n"
+
+
+def _append_archive(path: str, log_name: str, turns: list[_Turn]) -> None:
+    """Appends the turns verbatim to the archive and waits until durable."""
+    with locked(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT) as fd:
+        size = os.fstat(fd).st_size
+        parts = []
+        if size == 0:
+            parts.append(
+                f"# Archive: {log_name}\n\n"
+                f"Turns compacted out of [{log_name}]({log_name}), verbatim "
+                "and in order. This file is only ever appended to.\n\n".encode()
+            )
+        for turn in turns:
+            text = turn.text.rstrip(b"\n")
+            parts.append(text + b"\n\n")
+        data = b"".join(parts)
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+        os.fsync(fd)
+
+
+def _section(head: bytes) -> tuple[int, int] | None:
+    """Returns where the rollup blocks of `head` start and end, if it has any."""
+    section = _ROLLUP_RE.search(head)
+    if section is None:
+        return None
+    # The section ends at the rule before the next section.
+    work_log = _WORK_LOG_RE.search(head, section.end())
+    end = work_log.start() if work_log else len(head)
+    rule = head.rfind(b"\n---", section.end(), end)
+    end = rule + 1 if rule != -1 else end
+    block = _BLOCK_RE.search(head, section.end(), end)
+    return (block.start() if block else end), end
+
+
+def _existing(head: bytes) -> Rollup | None:
+    """Returns the rollup already in `head`, merging any separate blocks."""
+    span = _section(head)
+    if span is None or span[0] == span[1]:
+        return None
+    blocks = head[span[0] : span[1]]
+    starts = [match.start() for match in _BLOCK_RE.finditer(blocks)]
+    rollup = Rollup()
+    for start, end in zip(starts, starts[1:] + [len(blocks)]):
+        text = blocks[start:end].decode("utf-8", errors="replace")
+        rollup = rollup.merged(Rollup.parse(text))
+    return rollup
+
+
+def _with_rollup(head: bytes, block: str) -> bytes:
+    """Replaces the blocks of the `## Compacted Turns` section of `head`."""
+    encoded = block.encode("utf-8")
+    span = _section(head)
+    if span is not None:
+        start, end = span
+        return head[:start] + encoded + b"\n" + head[end:]
+    new_section = (
+        f"{ROLLUP_HEADING}\n"
+        "*(A rollup of the turns moved to the archive. Read the full turns "
+        "there with `read_turns`.)*\n\n"
+    ).encode() + encoded
+    work_log = _WORK_LOG_RE.search(head)
+    if work_log is None:
+        return head + b"\n" + new_section + b"\n"
+    at = work_log.start()
+    return head[:at] + new_section + b"\n---\n\n" + head[at:]
+
+
+def _choose(
+    turns: list[_Turn],
+    head: bytes,
+    size: int,
+    window: int,
+    budget: int,
+    archive_name: str,
+) -> tuple[list[_Turn], Rollup]:
+    """
+    Returns the turns to fold, in log order, and the log's rollup once they
+    are. `head` is the part of the log before the first turn.
+    """
+    rollup = _existing(head) or Rollup()
+    if len(turns) < 2:
+        return [], rollup
+    older, recent = turns[: -max(window, 1)], turns[-max(window, 1) : -1]
+    folded = [turn for turn in older if turn.status == "COMPLETED"]
+    if folded:
+        rollup = rollup.merged(Rollup.of(folded))
+    removed = sum(len(turn.text) for turn in folded)
+    for turn in recent:
+        if turn.status != "COMPLETED":
+            continue
+        projected = size - removed
+        if folded:
+            # The rollup counts against the budget too.
+            new_head = _with_rollup(head, rollup.render(archive_name))
+            projected += len(new_head) - len(head)
+        if projected <= budget:
+            break
+        folded.append(turn)
+        rollup = rollup.merged(Rollup.of([turn]))
+        removed += len(turn.text)
+    return folded, rollup
+
+
+@dataclass
+class CompactionResult:
+    """The outcome of compacting one Session Log."""
+
+    session_log: str
+    archive: str
+    compacted_turns: list[int]
+    size_before: int
+    size_after: int
+    budget: int
+
+    def to_dict(self) -> dict:
+        return {
+            "session_log": self.session_log,
+            "archive": self.archive,
+            "compacted_turns": _ranges(self.compacted_turns),
+            "size_before": self.size_before,
+            "size_after": self.size_after,
+            "over_budget": self.size_after > self.budget,
+        }
+
+
+def _replace(path: str, data: bytes, mode: int, index: TurnIndex) -> None:
+    """
+    Atomically replaces the Session Log at `path`, whose lock the caller
+    holds, with `data`.
+
+    The new file is locked before it is renamed into place, so appenders that
+    open it wait until its turn index is up to date; appenders still waiting
+    on the old file notice it was replaced (see `locked`).
+    """
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        os.chmod(tmp, stat.S_IMODE(mode))
+        with locked(tmp, os.O_RDWR) as fd:
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+            os.fsync(fd)
+            os.replace(tmp, path)
+            _fsync_directory(os.path.dirname(path))
+            index.sync(fd)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def _fsync_directory(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def compact(
+    path: str, *, window: int = DEFAULT_WINDOW, budget: int = DEFAULT_BUDGET
+) -> CompactionResult:
+    """Compacts the Session Log at `path` (see the module docstring)."""
+    path = resolve_path(path)
+    archive = archive_path(path)
+    archive_name = os.path.basename(archive)
+    index = TurnIndex(path)
+    with locked(path, os.O_RDWR) as fd:
+        size = os.fstat(fd).st_size
+        data = os.pread(fd, size, 0)
+        turns = _turns(data)
+        first = turns[0].start if turns else size
+        head = data[:first]
+        folded, rollup = _choose(turns, head, size, window, budget, archive_name)
+        if rollup.numbers:
+            head = _with_rollup(head, rollup.render(archive_name))
+        # With nothing to fold, the head is still rewritten if merging the
+        # separate rollup blocks written by older versions shrinks it.
+        if not folded and len(head) >= first:
+            return CompactionResult(path, archive, [], size, size, budget)
+
+        if folded:
+            # The archive is durable before anything leaves the live log.
+            _append_archive(archive, os.path.basename(path), folded)
+
+        numbers = {turn.number for turn in folded}
+        kept = [turn.text for turn in turns if turn.number not in numbers]
+        new = head + b"".join(kept)
+        _replace(path, new, os.fstat(fd).st_mode, index)
+        return CompactionResult(path, archive, sorted(numbers), size, len(new), budget)
+
+
+_running: dict[str, asyncio.Task] = {}
+# The size below which a log that compaction left over budget is not
+# compacted again.
+_floors: dict[str, int] = {}
+
+
+def _finished(path: str, task: asyncio.Task) -> None:
+    _running.pop(path, None)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        # A failed background compaction leaves the log as it was; the next
+        # append past the budget tries again.
+        return
+    result = task.result()
+    if result.size_after > result.budget:
+        # Growing the floor geometrically keeps the cost of rewriting a log
+        # that cannot get under budget proportional to what is appended.
+        _floors[path] = result.size_after + result.size_after // 4
+    else:
+        _floors.pop(path, None)
+
+
+def schedule_compaction(path: str) -> bool:
+    """
+    Starts compacting `path` in the background if it is over the budget, and
+    has grown enough since a compaction last left it over budget.
+
+    Returns whether a compaction was started. At most one runs per log.
+    """
+    path = resolve_path(path)
+    if not AUTO_COMPACT or path in _running:
+        return False
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        return False
+    if size <= max(DEFAULT_BUDGET, _floors.get(path, 0)):
+        return False
+    task = asyncio.create_task(asyncio.to_thread(compact, path, budget=DEFAULT_BUDGET))
+    _running[path] = task
+    task.add_done_callback(lambda task: _finished(path, task))
+    return True
@@ -0,0 +1,269 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Structured access to the `Master Plan` of a Session Log.
+
+The Master Plan is a nested Markdown checkbox list:
+
+    - [ ] Step 1: ...
+    - [ ] Step 2: ...
+      - [x] Step 2.1: ...
+
+It is parsed into a tree of `Step`s with stable IDs: a step whose text starts
+with `Step <id>:` keeps that ID, and any other step is numbered by its
+position under its parent. Updates patch the file in place rather than
+rewriting it. Marking a step done overwrites the single byte inside its
+checkbox. Inserting fix-it subtasks moves the plan lines after the insertion
+point down into a line of spaces kept at the end of the section, so the Work
+Log does not move. Only when that padding runs out is the rest of the file
+moved, with a fresh `PLAN_PADDING` spaces reserved for later insertions; the
+turn index is then shifted rather than rebuilt.
+
+Only the head of the file up to the end of the Master Plan section is read.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+
+from gemini_cli_mcp.session_log import locked, resolve_path
+from gemini_cli_mcp.turn_index import TurnIndex
+
+_SECTION_RE = re.compile(rb"^[ \t]*## Master Plan[ \t]*$", re.MULTILINE)
+# The section ends at the next heading or horizontal rule.
+_SECTION_END_RE = re.compile(rb"^[ \t]*(?:#{1,2} |---)", re.MULTILINE)
+_STEP_RE = re.compile(rb"^([ \t]*)[-*] \[([ xX])\] (.*)$", re.MULTILINE)
+_STEP_ID_RE = re.compile(r"^[*_]*Step (\d+(?:\.\d+)*)\s*:")
+
+PLAN_PADDING = 1024
+
+_READ_BLOCK = 16 * 1024
+_CHILD_INDENT = "  "
+
+
+class PlanError(Exception):
+    """Raised when the Master Plan is missing or a step cannot be found."""
+
+
+@dataclass
+class Step:
+    """A single checkbox in the Master Plan."""
+
+    id: str
+    text: str
+    done: bool
+    depth: int
+    indent: str
+    # Byte offsets in the Session Log.
+    box: int
+    line_end: int
+    children: list["Step"] = field(default_factory=list)
+
+    def subtree_end(self) -> int:
+        """Returns the offset just past the last line of this step's subtree."""
+        return self.children[-1].subtree_end() if self.children else self.line_end
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "text": self.text, "done": self.done}
+
+
+@dataclass
+class MasterPlan:
+    """The parsed Master Plan of a Session Log."""
+
+    steps: list[Step]
+
+    def walk(self) -> list[Step]:
+        """Returns every step in document order."""
+        ordered: list[Step] = []
+        pending = list(reversed(self.steps))
+        while pending:
+            step = pending.pop()
+            ordered.append(step)
+            pending.extend(reversed(step.children))
+        return ordered
+
+    def find(self, step_id: str) -> Step:
+        for step in self.walk():
+            if step.id == step_id:
+                return step
+        raise PlanError(f"No step {step_id!r} in the Master Plan.")
+
+    def next_open(self) -> Step | None:
+        """
+        Returns the next step to work on.
+
+        That is the first unchecked step, in document order, whose substeps
+        are all checked: a parent is only worked on after its substeps.
+        """
+        for step in self.walk():
+            if not step.done and all(child.done for child in step.children):
+                return step
+        return None
+
+
+def _section(data: bytes) -> tuple[int, int]:
+    """Returns where the steps of the Master Plan section start and end."""
+    section = _SECTION_RE.search(data)
+    if section is None:
+        raise PlanError("The Session Log has no '## Master Plan' section.")
+    end = _SECTION_END_RE.search(data, section.end())
+    return section.end(), end.start() if end else len(data)
+
+
+def _padding(data: bytes, end: int) -> tuple[int, int]:
+    """
+    Returns the span of the section's last line, ending at `end`, if it holds
+    only spaces. Otherwise the span is empty.
+    """
+    if end == 0 or data[end - 1 : end] != b"\n":
+        return end, end
+    start = data.rfind(b"\n", 0, end - 1) + 1
+    if data[start : end - 1].strip(b" "):
+        return end, end
+    return start, end
+
+
+def parse_plan(data: bytes) -> MasterPlan:
+    """Parses the Master Plan section of a Session Log's contents."""
+    start, end = _section(data)
+    roots: list[Step] = []
+    # (indent width, step) for the current chain of ancestors.
+    stack: list[tuple[int, Step]] = []
+    for match in _STEP_RE.finditer(data, start, end):
+        indent = match.group(1).decode("utf-8")
+        width = len(indent.expandtabs(4))
+        while stack and stack[-1][0] >= width:
+            stack.pop()
+        siblings = stack[-1][1].children if stack else roots
+        text = match.group(3).decode("utf-8").rstrip()
+        explicit = _STEP_ID_RE.match(text)
+        if explicit:
+            step_id = explicit.group(1)
+        else:
+            position = str(len(siblings) + 1)
+            step_id = f"{stack[-1][1].id}.{position}" if stack else position
+        step = Step(
+            id=step_id,
+            text=text,
+            done=match.group(2) != b" ",
+            depth=len(stack),
+            indent=indent,
+            box=match.start(2),
+            line_end=min(match.end() + 1, end),
+        )
+        siblings.append(step)
+        stack.append((width, step))
+    return MasterPlan(roots)
+
+
+def _read_head(fd: int) -> bytes:
+    """Reads the file from the start until the Master Plan section has ended."""
+    data = bytearray()
+    while True:
+        chunk = os.pread(fd, _READ_BLOCK, len(data))
+        if not chunk:
+            return bytes(data)
+        data += chunk
+        section = _SECTION_RE.search(data)
+        if section:
+            end = _SECTION_END_RE.search(data, section.end())
+            # Only trust an end marker on a complete line, so that one cut in
+            # half by the block boundary is not mistaken for the real one.
+            if end and data.find(b"\n", end.start()) != -1:
+                return bytes(data)
+
+
+def _write(fd: int, data: bytes, offset: int) -> None:
+    while data:
+        written = os.pwrite(fd, data, offset)
+        data = data[written:]
+        offset += written
+
+
+class PlanFile:
+    """Reads and patches the Master Plan of a Session Log on disk."""
+
+    def __init__(self, path: str):
+        self.path = resolve_path(path)
+        self.index = TurnIndex(self.path)
+
+    def load(self) -> MasterPlan:
+        with locked(self.path) as fd:
+            return parse_plan(_read_head(fd))
+
+    def mark_done(self, step_id: str) -> Step:
+        """Checks the box of `step_id`, overwriting a single byte."""
+        with locked(self.path, os.O_RDWR) as fd:
+            step = parse_plan(_read_head(fd)).find(step_id)
+            if not step.done:
+                os.pwrite(fd, b"x", step.box)
+                step.done = True
+            return step
+
+    def insert_substeps(self, step_id: str, texts: list[str]) -> list[Step]:
+        """
+        Inserts unchecked substeps at the end of `step_id`'s subtree.
+
+        This is how fix-it tasks are added after a failed step; the step
+        itself stays open until its new substeps are done. The new steps are
+        labelled `Step <step_id>.<n>:` so their IDs stay stable. Each text
+        becomes a single line: line breaks in it are collapsed to spaces.
+        """
+        texts = [" ".join(text.split()) for text in texts]
+        if not all(texts):
+            raise PlanError("Substep descriptions must not be empty.")
+        with locked(self.path, os.O_RDWR) as fd:
+            data = _read_head(fd)
+            plan = parse_plan(data)
+            parent = plan.find(step_id)
+            indent = (
+                parent.children[0].indent
+                if parent.children
+                else parent.indent + _CHILD_INDENT
+            )
+            taken = {step.id for step in plan.walk()}
+            number = len(parent.children)
+            lines, new_ids = [], []
+            for text in texts:
+                number += 1
+                while f"{step_id}.{number}" in taken:
+                    number += 1
+                new_id = f"{step_id}.{number}"
+                new_ids.append(new_id)
+                lines.append(f"{indent}- [ ] Step {new_id}: {text}\n")
+
+            at = parent.subtree_end()
+            inserted = "".join(lines).encode("utf-8")
+            if at > 0 and data[at - 1 : at] != b"\n":
+                inserted = b"\n" + inserted
+            # The steps after the insertion point move down into the padding,
+            # and if it has room nothing past it changes.
+            start, stop = _padding(data, _section(data)[1])
+            room = stop - start - 1
+            spaces = room - len(inserted) if len(inserted) <= room else PLAN_PADDING
+            patch = inserted + data[at:start] + b" " * spaces + b"\n"
+            if len(patch) == stop - at:
+                _write(fd, patch, at)
+                os.fsync(fd)
+            else:
+                header = self.index.sync(fd)
+                size = os.fstat(fd).st_size
+                _write(fd, patch + os.pread(fd, size - stop, stop), at)
+                os.fsync(fd)
+                self.index.shift(fd, header, at, len(patch) - (stop - at))
+
+            updated = parse_plan(_read_head(fd))
+            return [updated.find(new_id) for new_id in new_ids]
@@ -0,0 +1,360 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-request metrics and a sampling profiler for the MCP servers.
+
+`MetricsMiddleware` records, for every prompt, tool and resource, the number
+of calls and errors, a latency histogram, and the byte sizes of arguments and
+responses. All servers in a process share one `Metrics` registry, which is
+served as the `metrics://summary` resource and, in daemon mode, as Prometheus
+text on `/metrics`.
+
+Recording is on unless `GEMINI_MCP_METRICS=0`; when off, the middleware only
+checks a flag before passing the request on.
+
+The `SamplingProfiler` periodically samples the stacks of all threads and
+aggregates them in collapsed-stack format (as used by flame graph tools). It
+is served as the `metrics://profile` resource and can be switched on and off
+at runtime by sending the process `SIGUSR2`.
+"""
+
+import bisect
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from pydantic import BaseModel
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    600.0,
+    # A specialist may run for up to scheduler.DEFAULT_TIMEOUT, and a dispatch
+    # for several of those in sequence.
+    1800.0,
+    3600.0,
+    7200.0,
+)
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+@dataclass
+class CallStats:
+    """Aggregated statistics for one prompt, tool or resource."""
+
+    calls: int = 0
+    errors: int = 0
+    latency_sum: float = 0.0
+    # One count per bucket in LATENCY_BUCKETS, plus one for anything slower.
+    latency_buckets: list[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1)
+    )
+    argument_bytes: int = 0
+    max_argument_bytes: int = 0
+    response_bytes: int = 0
+    max_response_bytes: int = 0
+
+    def record(
+        self, latency: float, argument_bytes: int, response_bytes: int | None
+    ) -> None:
+        self.calls += 1
+        self.latency_sum += latency
+        self.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.argument_bytes += argument_bytes
+        self.max_argument_bytes = max(self.max_argument_bytes, argument_bytes)
+        if response_bytes is None:
+            self.errors += 1
+        else:
+            self.response_bytes += response_bytes
+            self.max_response_bytes = max(self.max_response_bytes, response_bytes)
+
+    def latency_quantile(self, q: float) -> float | str | None:
+        """
+        Estimates a latency quantile as the upper bound of its bucket.
+
+        Past the last bucket this is `"+Inf"`, as in the Prometheus `le` label,
+        since JSON has no infinity.
+        """
+        if not self.calls:
+            return None
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return "+Inf"
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency_seconds": {
+                "mean": self.latency_sum / self.calls if self.calls else None,
+                "p50": self.latency_quantile(0.50),
+                "p95": self.latency_quantile(0.95),
+                "p99": self.latency_quantile(0.99),
+            },
+            "argument_bytes": {
+                "total": self.argument_bytes,
+                "max": self.max_argument_bytes,
+            },
+            "response_bytes": {
+                "total": self.response_bytes,
+                "max": self.max_response_bytes,
+            },
+        }
+
+
+class Metrics:
+    """The metrics registry shared by all servers in the process."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.time()
+        self.stats: dict[tuple[str, str], CallStats] = {}
+
+    def record(
+        self,
+        kind: str,
+        name: str,
+        latency: float,
+        argument_bytes: int,
+        response_bytes: int | None,
+    ) -> None:
+        stats = self.stats.get((kind, name))
+        if stats is None:
+            stats = self.stats[(kind, name)] = CallStats()
+        stats.record(latency, argument_bytes, response_bytes)
+
+    def summary(self) -> dict:
+        result: dict = {"enabled": self.enabled, "since": self.started}
+        for (kind, name), stats in sorted(self.stats.items()):
+            result.setdefault(kind, {})[name] = stats.to_dict()
+        return result
+
+    def prometheus(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# TYPE mcp_calls_total counter",
+            "# TYPE mcp_errors_total counter",
+            "# TYPE mcp_latency_seconds histogram",
+            "# TYPE mcp_argument_bytes_total counter",
+            "# TYPE mcp_response_bytes_total counter",
+        ]
+        for (kind, name), stats in sorted(self.stats.items()):
+            labels = f'kind="{kind}",name="{_escape(name)}"'
+            lines.append(f"mcp_calls_total{{{labels}}} {stats.calls}")
+            lines.append(f"mcp_errors_total{{{labels}}} {stats.errors}")
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), stats.latency_buckets):
+                cumulative += count
+                lines.append(
+                    f'mcp_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"mcp_latency_seconds_sum{{{labels}}} {stats.latency_sum}")
+            lines.append(f"mcp_latency_seconds_count{{{labels}}} {stats.calls}")
+            lines.append(f"mcp_argument_bytes_total{{{labels}}} {stats.argument_bytes}")
+            lines.append(f"mcp_response_bytes_total{{{labels}}} {stats.response_bytes}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _payload_size(value) -> int:
+    """
+    Returns the encoded size of the text and scalars in `value`.
+
+    Walking the payload, rather than serializing it, keeps the cost of
+    measuring a large prompt argument or tool result to a few microseconds.
+    JSON punctuation and field names are not counted.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_payload_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_size(item) for item in value)
+    if isinstance(value, BaseModel):
+        return sum(_payload_size(item) for item in vars(value).values())
+    if hasattr(value, "content"):
+        # Resource contents.
+        return _payload_size(value.content)
+    return len(str(value))
+
+
+METRICS = Metrics(enabled=os.environ.get("GEMINI_MCP_METRICS", "1") != "0")
+
+
+class MetricsMiddleware(Middleware):
+    """Records prompt, tool and resource calls into a `Metrics` registry."""
+
+    def __init__(self, metrics: Metrics = METRICS):
+        self.metrics = metrics
+
+    async def _measure(self, kind, name, arguments, context, call_next):
+        if not self.metrics.enabled:
+            return await call_next(context)
+        started = time.perf_counter()
+        try:
+            result = await call_next(context)
+        except Exception:
+            self.metrics.record(
+                kind,
+                name,
+                time.perf_counter() - started,
+                _payload_size(arguments),
+                None,
+            )
+            raise
+        latency = time.perf_counter() - started
+        self.metrics.record(
+            kind, name, latency, _payload_size(arguments), _payload_size(result)
+        )
+        return result
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        message = context.message
+        return await self._measure(
+            "tool", message.name, message.arguments, context, call_next
+        )
+
+    async def on_get_prompt(self, context: MiddlewareContext, call_next):
+        message = context.message
+        return await self._measure(
+            "prompt", message.name, message.arguments, context, call_next
+        )
+
+    async def on_read_resource(self, context: MiddlewareContext, call_next):
+        uri = str(context.message.uri)
+        return await self._measure("resource", uri, None, context, call_next)
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed interval."""
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def toggle(self) -> None:
+        self.stop() if self.running else self.start()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Returns the samples in collapsed-stack format, most frequent first."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.samples.most_common()
+        )
+
+
+PROFILER = SamplingProfiler()
+
+
+# Not defined on Windows, where the profiler can only be toggled in-process.
+PROFILER_SIGNAL = getattr(signal, "SIGUSR2", None)
+
+
+def install_profiler_signal(signum: int | None = PROFILER_SIGNAL) -> None:
+    """Toggles the sampling profiler whenever the process receives `signum`."""
+    if signum is None:
+        return
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signum, lambda *_: PROFILER.toggle())
+
+
+def add_metrics(mcp: FastMCP) -> None:
+    """Adds the metrics middleware and the `metrics://` resources to `mcp`."""
+    mcp.add_middleware(MetricsMiddleware())
+
+    @mcp.resource("metrics://summary", mime_type="application/json")
+    def metrics_summary() -> str:
+        """Call counts, latencies and payload sizes per prompt, tool and resource."""
+        return json.dumps(METRICS.summary(), indent=2)
+
+    @mcp.resource("metrics://profile", mime_type="text/plain")
+    def metrics_profile() -> str:
+        """Sampled stacks in collapsed-stack format (toggle with SIGUSR2)."""
+        state = "running" if PROFILER.running else "stopped"
+        return f"# profiler {state}\n{PROFILER.collapsed()}"
+
+    install_profiler_signal()
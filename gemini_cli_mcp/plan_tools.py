@@ -0,0 +1,101 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+MCP tools for the Master Plan, shared by the SuperAgent and DynAgent servers.
+"""
+
+import asyncio
+from typing import Annotated
+
+from fastmcp import FastMCP
+from fastmcp.exceptions import ToolError
+from pydantic import Field
+
+from gemini_cli_mcp.master_plan import PlanError, PlanFile
+
+SessionLogPath = Annotated[
+    str,
+    Field(description="Path to the Session Log file (`~` is expanded)."),
+]
+StepId = Annotated[
+    str, Field(description="ID of a Master Plan step, e.g. '2' or '2.1'.")
+]
+
+
+async def _run(func, *args):
+    try:
+        return await asyncio.to_thread(func, *args)
+    except FileNotFoundError as e:
+        raise ToolError(f"Session Log not found: {e.filename}")
+    except PlanError as e:
+        raise ToolError(str(e))
+
+
+def add_plan_tools(mcp: FastMCP) -> None:
+    """Registers the Master Plan tools on `mcp`."""
+
+    @mcp.tool
+    async def read_master_plan(session_log: SessionLogPath) -> list[dict]:
+        """
+        Returns every step of the `Master Plan` in document order.
+
+        Each step has its stable `id`, its `text` and whether it is `done`.
+        """
+        plan = await _run(PlanFile(session_log).load)
+        return [step.to_dict() for step in plan.walk()]
+
+    @mcp.tool
+    async def next_open_step(session_log: SessionLogPath) -> dict | None:
+        """
+        Returns the next unchecked `Master Plan` step to work on.
+
+        Substeps come before their parent step. Returns nothing once every
+        step is done.
+        """
+        plan = await _run(PlanFile(session_log).load)
+        step = plan.next_open()
+        return step.to_dict() if step else None
+
+    @mcp.tool
+    async def mark_step_done(session_log: SessionLogPath, step_id: StepId) -> dict:
+        """
+        Marks a `Master Plan` step as done (`[ ]` -> `[x]`) in place.
+
+        Only the checkbox is changed; the rest of the Session Log is untouched.
+        """
+        step = await _run(PlanFile(session_log).mark_done, step_id)
+        return step.to_dict()
+
+    @mcp.tool
+    async def insert_fix_steps(
+        session_log: SessionLogPath,
+        step_id: StepId,
+        steps: Annotated[
+            list[str],
+            Field(
+                min_length=1,
+                description="Descriptions of the fix-it subtasks, in order.",
+            ),
+        ],
+    ) -> list[dict]:
+        """
+        Adds fix-it subtasks under a failed `Master Plan` step.
+
+        The new substeps are unchecked and numbered after the step's existing
+        substeps (e.g. 2.1 gets 2.1.1, 2.1.2, ...). The failed step stays open
+        and becomes the next step again once its fix-it substeps are done.
+        """
+        new = await _run(PlanFile(session_log).insert_substeps, step_id, steps)
+        return [step.to_dict() for step in new]
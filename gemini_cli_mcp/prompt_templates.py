@@ -0,0 +1,113 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prompt templates loaded from files.
+
+A template file uses `str.format` syntax (`{args}`, with `{{`/`}}` for literal
+braces). It is parsed once into a list of literal segments and field names,
+and parsed again only when its mtime or size changes, so prompts can be edited
+on a running server without a restart. Rendering joins the cached segments,
+and an LRU keeps the most recent renders for each template version. The LRU
+is bounded both in entries and in the memory held by its arguments and
+renders; a render too large to share that budget is not cached at all.
+"""
+
+import os
+import string
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_CACHE_SIZE = 64
+DEFAULT_CACHE_BYTES = 4 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class _Parsed:
+    # (mtime_ns, size) of the file the segments were parsed from.
+    version: tuple[int, int]
+    # Alternating literal text and field names; fields are at odd positions.
+    segments: tuple[str, ...]
+
+
+def _parse(text: str, strip: bool) -> tuple[str, ...]:
+    segments: list[str] = [""]
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(text):
+        segments[-1] += literal
+        if field_name is None:
+            continue
+        if not field_name.isidentifier() or format_spec or conversion:
+            raise ValueError(f"Unsupported template field: {field_name!r}")
+        segments += [field_name, ""]
+    if strip:
+        segments[0] = segments[0].lstrip()
+        segments[-1] = segments[-1].rstrip()
+    return tuple(segments)
+
+
+class PromptTemplate:
+    """A prompt template file, reloaded when it changes on disk."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        strip: bool = False,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+    ):
+        self.path = Path(path)
+        self.strip = strip
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        self._parsed: _Parsed | None = None
+        # Each render with the memory held by it and its arguments.
+        self._renders: OrderedDict[tuple, tuple[str, int]] = OrderedDict()
+        self._cached_bytes = 0
+
+    def _load(self) -> _Parsed:
+        st = os.stat(self.path)
+        version = (st.st_mtime_ns, st.st_size)
+        parsed = self._parsed
+        if parsed is None or parsed.version != version:
+            text = self.path.read_text(encoding="utf-8")
+            parsed = self._parsed = _Parsed(version, _parse(text, self.strip))
+        return parsed
+
+    def render(self, **values: str) -> str:
+        """Renders the current version of the template with `values`."""
+        parsed = self._load()
+        key = (parsed.version, *sorted(values.items()))
+        cached = self._renders.get(key)
+        if cached is not None:
+            self._renders.move_to_end(key)
+            return cached[0]
+        segments = parsed.segments
+        parts = list(segments)
+        for i in range(1, len(segments), 2):
+            parts[i] = values[segments[i]]
+        rendered = "".join(parts)
+        size = sys.getsizeof(rendered) + sum(map(sys.getsizeof, values.values()))
+        # One large render would otherwise evict every other entry.
+        if size <= self.cache_bytes // 4:
+            self._renders[key] = (rendered, size)
+            self._cached_bytes += size
+            while (
+                len(self._renders) > self.cache_size
+                or self._cached_bytes > self.cache_bytes
+            ):
+                self._cached_bytes -= self._renders.popitem(last=False)[1][1]
+        return rendered
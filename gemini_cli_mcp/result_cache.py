@@ -0,0 +1,377 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Content-addressed cache of specialist results.
+
+A specialist run is keyed on the SHA-256 of its prompt file's contents and on
+the state of the working tree it runs in: in a git repository, the `HEAD`
+tree plus the content hashes of the paths `git status` reports as changed or
+untracked (hashed without writing anything to the repository); elsewhere, a
+digest of every file's path, size and mtime. Re-delegating the same prompt
+against the same tree, such as a verification re-run when nothing changed,
+returns the stored result instead of starting `gemini` again. Only batches
+given an explicit working directory are cached, so a shared server never
+digests its own directory.
+
+Only runs that `COMPLETED` without changing the working tree are stored, since
+replaying the result of a run that edited files would not reproduce its
+edits. When the task names its Session Log, the specialist's turn is stored
+too, and a cache hit appends it again as a new turn that says it was reused.
+
+Prompts are stored split into paragraphs, each kept once by its hash, so the
+preamble shared by many prompt files takes no extra space. Entries expire
+after `DEFAULT_MAX_AGE` seconds, and the least recently used are evicted once
+the cache exceeds `DEFAULT_MAX_BYTES`.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import stat
+import threading
+import time
+from pathlib import Path
+
+from gemini_cli_mcp.checkpoints import GitError, run_git
+from gemini_cli_mcp.scheduler import SpecialistResult, SpecialistTask
+from gemini_cli_mcp.session_log import TurnEntry, open_log, resolve_path
+
+CACHE_DIR = (
+    Path(os.environ.get("GEMINI_MCP_STATE_DIR", "~/.cache/gemini-cli-mcp-servers"))
+    .expanduser()
+    .joinpath("specialist-results")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("GEMINI_RESULT_CACHE_MAX_BYTES", 64 << 20))
+DEFAULT_MAX_AGE = float(os.environ.get("GEMINI_RESULT_CACHE_MAX_AGE", 7 * 86400))
+
+# The number of recent turns searched for the specialist's own entry.
+_LOG_LOOKBACK = 50
+_REUSED = (
+    "Reused the result of an identical earlier run (same prompt, same working "
+    "tree) instead of running the specialist again."
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    prompt TEXT NOT NULL,
+    result TEXT NOT NULL,
+    log_entry TEXT
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+_PARAGRAPH_END_RE = re.compile(rb"(?<=\n\n)(?!\n)")
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _stat_digest(directory: str) -> str:
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(path)
+            except FileNotFoundError:
+                continue
+            relative = os.path.relpath(path, directory)
+            digest.update(f"{relative}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+    return digest.hexdigest()
+
+
+def _changes(root: str) -> list[str]:
+    """Returns the changed, deleted and untracked paths under `root`."""
+    output = run_git(
+        root,
+        "--no-optional-locks",
+        "status",
+        "--porcelain=v1",
+        "-z",
+        "--untracked-files=all",
+    )
+    paths, fields = [], iter(output.split("\0"))
+    for field in fields:
+        if not field:
+            continue
+        paths.append(field[3:])
+        if field[0] in "RC":
+            # Renames and copies are followed by their source path.
+            paths.append(next(fields, ""))
+    return sorted(set(filter(None, paths)))
+
+
+def tree_state(cwd: str) -> str:
+    """Returns an identifier of the contents of the working tree at `cwd`."""
+    try:
+        root = run_git(cwd, "rev-parse", "--show-toplevel").strip()
+    except GitError:
+        return "stat:" + _stat_digest(cwd)
+    try:
+        head = run_git(root, "rev-parse", "-q", "--verify", "HEAD^{tree}").strip()
+    except GitError:
+        head = ""
+    digest = hashlib.sha256(f"{head}\0".encode())
+    states, regular = {}, []
+    for path in _changes(root):
+        full = os.path.join(root, path)
+        try:
+            st = os.lstat(full)
+        except FileNotFoundError:
+            states[path] = "deleted"
+            continue
+        if stat.S_ISREG(st.st_mode) and "\n" not in path:
+            regular.append(path)
+        elif stat.S_ISLNK(st.st_mode):
+            states[path] = "link:" + os.readlink(full)
+        else:
+            states[path] = f"{st.st_mode:o}:{st.st_size}:{st.st_mtime_ns}"
+    if regular:
+        # Without `-w`, nothing is written to the object database.
+        blobs = run_git(
+            root, "hash-object", "--stdin-paths", input="\n".join(regular).encode()
+        ).split()
+        for path, blob in zip(regular, blobs):
+            executable = os.stat(os.path.join(root, path)).st_mode & 0o100
+            states[path] = f"{'x' if executable else ''}{blob}"
+    for path in sorted(states):
+        digest.update(f"{path}\0{states[path]}\0".encode())
+    return "git:" + digest.hexdigest()
+
+
+def _paragraphs(data: bytes) -> list[bytes]:
+    return [block for block in _PARAGRAPH_END_RE.split(data) if block]
+
+
+class ResultCache:
+    """A persistent, size- and age-bounded cache of specialist results."""
+
+    def __init__(
+        self,
+        directory: str | Path = CACHE_DIR,
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age: float = DEFAULT_MAX_AGE,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.directory / "results.sqlite3",
+                timeout=10,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def key(self, prompt: bytes, state: str) -> str:
+        """Returns the cache key of a prompt run against a working tree state."""
+        return _sha256(f"{_sha256(prompt)}\0{state}".encode())
+
+    def get(self, key: str) -> tuple[dict, str | None] | None:
+        """Returns the stored result and log entry for `key`, if fresh."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT created, result, log_entry FROM results WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            created, result, log_entry = row
+            if now - created > self.max_age:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(result), log_entry
+
+    def put(self, key: str, prompt: bytes, result: dict, log_entry: str | None) -> None:
+        """Stores a result, then evicts expired and least recently used entries."""
+        now = time.time()
+        paragraphs = [(_sha256(block), block) for block in _paragraphs(prompt)]
+        blocks = dict(paragraphs)
+        hashes = json.dumps([block_hash for block_hash, _ in paragraphs])
+        encoded = json.dumps(result)
+        size = len(prompt) + len(encoded) + len((log_entry or "").encode())
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO blocks (hash, data) VALUES (?, ?)",
+                    blocks.items(),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, created, accessed, size,"
+                    " prompt, result, log_entry) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, now, now, size, hashes, encoded, log_entry),
+                )
+                self._evict(conn, now)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM results WHERE created < ?", (now - self.max_age,))
+        (total,) = conn.execute("SELECT coalesce(sum(size), 0) FROM results").fetchone()
+        if total > self.max_bytes:
+            keys = []
+            for key, size in conn.execute(
+                "SELECT key, size FROM results ORDER BY accessed"
+            ):
+                if total <= self.max_bytes:
+                    break
+                keys.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM results WHERE key = ?", keys)
+        conn.execute(
+            "DELETE FROM blocks WHERE hash NOT IN"
+            " (SELECT json_each.value FROM results, json_each(results.prompt))"
+        )
+
+    def prompt(self, key: str) -> bytes | None:
+        """Reassembles the prompt file stored with `key`."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT prompt FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            data = dict(
+                conn.execute(
+                    "SELECT hash, data FROM blocks WHERE hash IN"
+                    " (SELECT value FROM json_each(?))",
+                    (row[0],),
+                )
+            )
+        return b"".join(data[block] for block in json.loads(row[0]))
+
+    async def lookup(
+        self, task: SpecialistTask, cwd: str | None
+    ) -> tuple[str | None, SpecialistResult | None]:
+        """
+        Returns the cache key for running `task` now, and the stored result if
+        there is one. On a hit, the stored turn is appended to the task's
+        Session Log again.
+
+        The key is `None` if it cannot be computed (e.g. the prompt file is
+        missing, or no working directory was given); the task then simply runs
+        uncached. If the Session Log cannot be appended to, the stored result
+        is still returned, without a `log_entry`.
+        """
+        if cwd is None:
+            return None, None
+        try:
+            key = await asyncio.to_thread(self._key_for, task, cwd)
+            stored = await asyncio.to_thread(self.get, key)
+        except (OSError, GitError, sqlite3.Error):
+            return None, None
+        if stored is None:
+            return key, None
+        fields, log_entry = stored
+        result = SpecialistResult(
+            **{**fields, "id": task.id, "prompt_file": task.prompt_file},
+            cached=True,
+        )
+        if log_entry is not None and task.session_log:
+            entry = TurnEntry.parse(log_entry)
+            entry.prompt = task.prompt_file
+            entry.thought = f"{_REUSED}\n{entry.thought}"
+            try:
+                number = await open_log(task.session_log).append(entry)
+            except OSError:
+                result.log_entry = None
+            else:
+                result.log_entry = entry.render(number)
+        else:
+            result.log_entry = log_entry
+        return key, result
+
+    async def store(
+        self, key: str, task: SpecialistTask, result: SpecialistResult, cwd: str | None
+    ) -> None:
+        """Stores a completed result, unless the run changed the working tree."""
+        if result.status != "COMPLETED" or cwd is None:
+            return
+        try:
+            unchanged = await asyncio.to_thread(self._key_for, task, cwd) == key
+        except (OSError, GitError):
+            unchanged = False
+        if not unchanged:
+            return
+        log_entry = None
+        if task.session_log:
+            log_entry = await self._find_entry(task)
+            result.log_entry = log_entry
+        fields = result.to_dict()
+        del fields["cached"], fields["log_entry"]
+        try:
+            prompt = await asyncio.to_thread(
+                Path(task.prompt_file).expanduser().read_bytes
+            )
+            await asyncio.to_thread(self.put, key, prompt, fields, log_entry)
+        except (OSError, sqlite3.Error):
+            pass
+
+    def _key_for(self, task: SpecialistTask, cwd: str) -> str:
+        prompt = Path(task.prompt_file).expanduser().read_bytes()
+        return self.key(prompt, tree_state(cwd))
+
+    async def _find_entry(self, task: SpecialistTask) -> str | None:
+        """Returns the most recent turn logged for the task's prompt file."""
+        prompt_file = resolve_path(task.prompt_file)
+        try:
+            turns = await open_log(task.session_log).read_turns(last=_LOG_LOOKBACK)
+        except OSError:
+            return None
+        for text in reversed(turns):
+            if resolve_path(TurnEntry.parse(text).prompt) == prompt_file:
+                return text
+        return None
+
+
+_cache: ResultCache | None = None
+
+
+def open_cache() -> ResultCache:
+    """Returns the process-wide result cache."""
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
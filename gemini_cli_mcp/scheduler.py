@@ -0,0 +1,286 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Concurrent dispatch of specialist agents.
+
+A batch is a set of specialist prompt files with declared dependencies. Each
+specialist runs as its own `gemini` subprocess as soon as all of its
+dependencies have completed successfully, with at most `max_concurrency`
+running at once. A specialist whose dependency did not complete is skipped.
+
+Specialists run in their own process group so that a timeout or cancellation
+also stops any processes they started.
+
+With a `ResultStore` (see `result_cache`), a specialist whose result is
+already stored is not run again; the stored result is returned instead.
+"""
+
+import asyncio
+import os
+import shutil
+import signal
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from typing import Protocol
+
+GEMINI = "gemini"
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 30 * 60.0
+
+# Grace period between SIGTERM and SIGKILL when a specialist times out.
+_KILL_GRACE = 5.0
+# Only the tail of each output stream is kept in the result.
+_OUTPUT_LIMIT = 16 * 1024
+
+
+@dataclass
+class SpecialistTask:
+    """A specialist to run: its prompt file and the tasks it depends on."""
+
+    id: str
+    prompt_file: str
+    depends_on: list[str] = field(default_factory=list)
+    # The Session Log the specialist appends its turn to, if known.
+    session_log: str | None = None
+
+
+@dataclass
+class SpecialistResult:
+    """The outcome of running (or not running) a specialist."""
+
+    id: str
+    prompt_file: str
+    # COMPLETED | FAILED | TIMED_OUT | CANCELLED | SKIPPED
+    status: str
+    exit_code: int | None = None
+    duration: float = 0.0
+    stdout: str = ""
+    stderr: str = ""
+    # Whether this is the stored result of an earlier, identical run.
+    cached: bool = False
+    # The specialist's turn in the Session Log, when it was looked up.
+    log_entry: str | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ResultStore(Protocol):
+    """Looks up and stores specialist results, keyed on their inputs."""
+
+    async def lookup(
+        self, task: SpecialistTask, cwd: str | None
+    ) -> tuple[str | None, SpecialistResult | None]: ...
+
+    async def store(
+        self, key: str, task: SpecialistTask, result: SpecialistResult, cwd: str | None
+    ) -> None: ...
+
+
+def specialist_command(gemini: str, prompt_file: str) -> list[str]:
+    """
+    Returns the command line that runs a specialist on `prompt_file`.
+
+    Unlike the interactive `gemini -i` used for a single delegated specialist,
+    `-p` runs the prompt non-interactively and exits when the work is done.
+    """
+    return [gemini, "-y", "-p", f"Please execute the instructions in {prompt_file}"]
+
+
+def check_batch(tasks: list[SpecialistTask]) -> None:
+    """Raises `ValueError` for duplicate IDs, unknown dependencies or cycles."""
+    ids = [task.id for task in tasks]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Specialist task IDs must be unique.")
+    deps = {task.id: set(task.depends_on) for task in tasks}
+    for task_id, task_deps in deps.items():
+        unknown = task_deps - deps.keys()
+        if unknown:
+            raise ValueError(
+                f"Task {task_id!r} depends on unknown tasks: {sorted(unknown)}"
+            )
+    # Kahn's algorithm: anything left over is part of a cycle.
+    remaining = dict(deps)
+    while True:
+        ready = [task_id for task_id, task_deps in remaining.items() if not task_deps]
+        if not ready:
+            break
+        for task_id in ready:
+            del remaining[task_id]
+        for task_deps in remaining.values():
+            task_deps.difference_update(ready)
+    if remaining:
+        raise ValueError(f"Dependency cycle between tasks: {sorted(remaining)}")
+
+
+def _tail(data: bytes) -> str:
+    return data[-_OUTPUT_LIMIT:].decode("utf-8", errors="replace")
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+class _Batch:
+    def __init__(
+        self,
+        gemini: str,
+        cwd: str | None,
+        timeout: float | None,
+        cache: ResultStore | None = None,
+    ):
+        self.gemini = gemini
+        self.cwd = cwd
+        self.timeout = timeout
+        self.cache = cache
+        self.cancelled = False
+        self.running: set[asyncio.subprocess.Process] = set()
+
+    def cancel(self) -> None:
+        """Stops every running specialist and prevents new ones from starting."""
+        self.cancelled = True
+        for proc in self.running:
+            _signal_group(proc, signal.SIGKILL)
+
+    async def run(self, task: SpecialistTask) -> SpecialistResult:
+        if self.cancelled or self.cache is None:
+            return await self._execute(task)
+        # The cache is an optimization: if it fails, the specialist just runs.
+        try:
+            key, cached = await self.cache.lookup(task, self.cwd)
+        except Exception:
+            key, cached = None, None
+        if cached is not None:
+            return cached
+        result = await self._execute(task)
+        if key is not None:
+            try:
+                await self.cache.store(key, task, result, self.cwd)
+            except Exception:
+                pass
+        return result
+
+    async def _execute(self, task: SpecialistTask) -> SpecialistResult:
+        result = SpecialistResult(task.id, task.prompt_file, "CANCELLED")
+        if self.cancelled:
+            return result
+        started = time.monotonic()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *specialist_command(self.gemini, task.prompt_file),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=self.cwd,
+                start_new_session=True,
+            )
+        except OSError as e:
+            result.status, result.stderr = "FAILED", str(e)
+            return result
+        self.running.add(proc)
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), self.timeout)
+        except TimeoutError:
+            _signal_group(proc, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(proc.wait(), _KILL_GRACE)
+            except TimeoutError:
+                _signal_group(proc, signal.SIGKILL)
+                await proc.wait()
+            result.status = "TIMED_OUT"
+            stdout = stderr = b""
+        except asyncio.CancelledError:
+            _signal_group(proc, signal.SIGKILL)
+            raise
+        finally:
+            self.running.discard(proc)
+            result.duration = round(time.monotonic() - started, 3)
+
+        result.exit_code = proc.returncode
+        result.stdout, result.stderr = _tail(stdout), _tail(stderr)
+        if result.status != "TIMED_OUT":
+            if proc.returncode == 0:
+                result.status = "COMPLETED"
+            elif not self.cancelled:
+                result.status = "FAILED"
+        return result
+
+
+async def run_batch(
+    tasks: list[SpecialistTask],
+    *,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    timeout: float | None = DEFAULT_TIMEOUT,
+    fail_fast: bool = False,
+    cwd: str | None = None,
+    on_result: Callable[[SpecialistResult], Awaitable[None]] | None = None,
+    cache: ResultStore | None = None,
+) -> list[SpecialistResult]:
+    """
+    Runs a batch of specialists, respecting their dependencies.
+
+    Independent specialists run concurrently, at most `max_concurrency` at a
+    time, each limited to `timeout` seconds. With `fail_fast`, the first
+    specialist that does not complete cancels the rest of the batch.
+    Cancelling the returned coroutine kills every running specialist.
+    With a `cache`, stored results are reused and new ones stored.
+
+    Returns one result per task, in the order of `tasks`.
+    """
+    check_batch(tasks)
+    gemini = shutil.which(GEMINI)
+    if gemini is None:
+        raise FileNotFoundError(f"'{GEMINI}' was not found on PATH.")
+
+    batch = _Batch(gemini, cwd, timeout, cache)
+    slots = asyncio.Semaphore(max_concurrency)
+    finished = {task.id: asyncio.Event() for task in tasks}
+    results: dict[str, SpecialistResult] = {}
+
+    async def run_task(task: SpecialistTask) -> None:
+        for dep in task.depends_on:
+            await finished[dep].wait()
+        # An error in one task must not escape into the task group, which
+        # would cancel the whole batch and kill the other specialists.
+        try:
+            if any(results[dep].status != "COMPLETED" for dep in task.depends_on):
+                result = SpecialistResult(task.id, task.prompt_file, "SKIPPED")
+            else:
+                async with slots:
+                    result = await batch.run(task)
+        except Exception as e:
+            result = SpecialistResult(
+                task.id, task.prompt_file, "FAILED", stderr=f"{type(e).__name__}: {e}"
+            )
+        results[task.id] = result
+        finished[task.id].set()
+        if fail_fast and result.status not in ("COMPLETED", "SKIPPED"):
+            batch.cancel()
+        if on_result is not None:
+            try:
+                await on_result(result)
+            except Exception:
+                # Progress reports are best effort.
+                pass
+
+    async with asyncio.TaskGroup() as group:
+        for task in tasks:
+            group.create_task(run_task(task))
+    return [results[task.id] for task in tasks]
@@ -0,0 +1,131 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+MCP tools for searching past sessions, shared by the SuperAgent and DynAgent
+servers.
+"""
+
+import asyncio
+from typing import Annotated, Literal
+
+from fastmcp import FastMCP
+from fastmcp.exceptions import ToolError
+from pydantic import Field
+
+from gemini_cli_mcp.session_index import SearchError, open_index
+from gemini_cli_mcp.turn_index import TurnStatus
+
+Repo = Annotated[
+    str | None,
+    Field(description="Only this repository/folder name under the tasks directory."),
+]
+SessionId = Annotated[
+    str | None,
+    Field(description="Only sessions whose ID starts with this value."),
+]
+Since = Annotated[
+    str | None,
+    Field(description="Only files modified on or after this ISO date/date-time."),
+]
+Until = Annotated[
+    str | None,
+    Field(description="Only files modified up to this ISO date/date-time."),
+]
+
+
+async def _run(func, *args, **kwargs):
+    try:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    except ValueError as e:
+        raise ToolError(f"Invalid date: {e}")
+    except SearchError as e:
+        raise ToolError(str(e))
+
+
+def add_search_tools(mcp: FastMCP) -> None:
+    """Registers the session search tools on `mcp`."""
+
+    @mcp.tool
+    async def search_sessions(
+        query: Annotated[
+            str,
+            Field(
+                description="Words to search for. SQLite FTS5 syntax is supported, "
+                'e.g. `"connection pool" AND timeout` or `migrat*`.'
+            ),
+        ],
+        repo: Repo = None,
+        session_id: SessionId = None,
+        status: Annotated[
+            TurnStatus | None, Field(description="Only turns with this status.")
+        ] = None,
+        kind: Annotated[
+            Literal["session_log", "prompt", "archive"] | None,
+            Field(
+                description="Only Session Logs, specialist prompts, or archives "
+                "of compacted turns."
+            ),
+        ] = None,
+        since: Since = None,
+        until: Until = None,
+        limit: Annotated[int, Field(ge=1, le=100)] = 10,
+    ) -> list[dict]:
+        """
+        Searches past Session Logs and specialist prompts, best match first.
+
+        Every Session Log turn and every prompt file is a separate result, with
+        its `path`, `turn` and `status` and a `snippet` highlighting the match,
+        so findings from earlier sessions can be reused without reading the
+        files one by one.
+        """
+        return await _run(
+            open_index().search,
+            query,
+            repo=repo,
+            session_id=session_id,
+            status=status,
+            kind=kind,
+            since=since,
+            until=until,
+            limit=limit,
+        )
+
+    @mcp.tool
+    async def list_sessions(
+        repo: Repo = None,
+        session_id: SessionId = None,
+        status: Annotated[
+            TurnStatus | None,
+            Field(description="Only sessions whose last turn has this status."),
+        ] = None,
+        since: Since = None,
+        until: Until = None,
+        limit: Annotated[int, Field(ge=1, le=500)] = 20,
+    ) -> list[dict]:
+        """
+        Lists past Session Logs, most recently modified first.
+
+        Each entry has the log's `path`, `title`, number of `turns` and the
+        status of its last turn.
+        """
+        return await _run(
+            open_index().list_sessions,
+            repo=repo,
+            session_id=session_id,
+            status=status,
+            since=since,
+            until=until,
+            limit=limit,
+        )
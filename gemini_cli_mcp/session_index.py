@@ -0,0 +1,459 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Full-text index over past Session Logs and specialist prompts.
+
+Everything under the tasks directory (`~/tmp/gemini-tasks`, or
+`GEMINI_TASKS_DIR`) is laid out as:
+
+    <repo>/<session id>-<task>.md                 a Session Log
+    <repo>/<session id>/prompt-<n>-<task>.md      a specialist prompt
+    <repo>/<session id>-<task>.archive.md         turns compacted out of a log
+
+The index is a SQLite FTS5 database in the tasks directory. Each Session Log
+is indexed as one document for its header and Master Plan plus one document
+per turn, so results carry the turn number and status; each prompt file is a
+single document.
+
+The index is refreshed incrementally: files are matched against the size and
+mtime recorded when they were last indexed, and only new or changed files are
+read. Refreshes are throttled to one every `REFRESH_INTERVAL` seconds per
+process, so a burst of queries costs one directory walk.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from gemini_cli_mcp.compaction import ARCHIVE_SUFFIX
+from gemini_cli_mcp.turn_index import STATUS_RE, TURN_HEADER_RE
+
+DEFAULT_ROOT = "~/tmp/gemini-tasks"
+ROOT_ENV = "GEMINI_TASKS_DIR"
+INDEX_NAME = ".search-index.sqlite3"
+
+REFRESH_INTERVAL = 1.0
+SNIPPET_TOKENS = 24
+
+SESSION_LOG = "session_log"
+PROMPT = "prompt"
+ARCHIVE = "archive"
+
+# Chunk rowids are `file id << _CHUNK_BITS | chunk number`, so the chunks of a
+# file can be replaced with a rowid range delete.
+_CHUNK_BITS = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    turns INTEGER NOT NULL,
+    last_status TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+    title, body, turn UNINDEXED, status UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+_TITLE_RE = re.compile(rb"^# +(.+)$", re.MULTILINE)
+_SEARCH_TERM_RE = re.compile(r"\w+")
+
+
+def tasks_root() -> Path:
+    """Returns the tasks directory holding the Session Logs."""
+    return Path(os.environ.get(ROOT_ENV, DEFAULT_ROOT)).expanduser()
+
+
+class SearchError(Exception):
+    """Raised when a search query cannot be run."""
+
+
+@dataclass(frozen=True)
+class _Chunk:
+    title: str
+    body: str
+    turn: int | None = None
+    status: str | None = None
+
+
+@dataclass(frozen=True)
+class _Document:
+    kind: str
+    repo: str
+    session_id: str
+    title: str
+    chunks: list[_Chunk]
+
+    @property
+    def turns(self) -> int:
+        return sum(1 for chunk in self.chunks if chunk.turn is not None)
+
+    @property
+    def last_status(self) -> str | None:
+        return self.chunks[-1].status if self.chunks else None
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
+
+
+def _parse(relative: Path, data: bytes) -> _Document:
+    """Splits a Session Log or archive into its turns, or wraps a prompt file."""
+    parts = relative.parts
+    repo = parts[0] if len(parts) > 1 else ""
+    if relative.name.startswith("prompt-"):
+        session_id = parts[-2] if len(parts) > 2 else ""
+        chunk = _Chunk(relative.name, _decode(data))
+        return _Document(PROMPT, repo, session_id, relative.name, [chunk])
+
+    match = _TITLE_RE.search(data)
+    title = _decode(match.group(1)).strip() if match else relative.name
+    headers = list(TURN_HEADER_RE.finditer(data))
+    preamble_end = headers[0].start() if headers else len(data)
+    chunks = [_Chunk(title, _decode(data[:preamble_end]))]
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(data)
+        line_end = data.find(b"\n", header.start(), end)
+        line = data[header.start() : end if line_end < 0 else line_end]
+        status = STATUS_RE.search(data, header.end(), end)
+        chunks.append(
+            _Chunk(
+                _decode(line).lstrip("#").strip(),
+                _decode(data[header.start() : end]),
+                int(header.group(1)),
+                _decode(status.group(1)) if status else None,
+            )
+        )
+    if relative.name.endswith(ARCHIVE_SUFFIX):
+        session_id = relative.name.removesuffix(ARCHIVE_SUFFIX)
+        return _Document(ARCHIVE, repo, session_id, title, chunks)
+    return _Document(SESSION_LOG, repo, relative.stem, title, chunks)
+
+
+def _fts_query(query: str) -> str:
+    """Quotes every word of `query`, for queries that are not valid FTS5."""
+    return " ".join(f'"{term}"' for term in _SEARCH_TERM_RE.findall(query))
+
+
+def _timestamp_ns(value: str, end: bool = False) -> float:
+    """Converts an ISO date or date-time to ns; a date `end` covers that day."""
+    moment = datetime.fromisoformat(value)
+    seconds = moment.timestamp()
+    if end and "T" not in value and " " not in value.strip():
+        seconds += 24 * 60 * 60
+    # A float, as far-off dates do not fit in a 64-bit integer.
+    return seconds * 1e9
+
+
+def _iso(mtime_ns: int) -> str:
+    return datetime.fromtimestamp(mtime_ns / 1e9).isoformat(timespec="seconds")
+
+
+class SessionIndex:
+    """The search index of one tasks directory."""
+
+    def __init__(self, root: str | Path, refresh_interval: float = REFRESH_INTERVAL):
+        self.root = Path(root).expanduser()
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._refreshed = float("-inf")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.root / INDEX_NAME,
+                timeout=10,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _walk(self) -> dict[str, os.stat_result]:
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            for name in filenames:
+                if name.endswith(".md") and not name.startswith("."):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        found[path] = os.stat(path)
+                    except FileNotFoundError:
+                        pass
+        return found
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Indexes new and changed files and drops deleted ones.
+
+        Returns the number of files (re)indexed. Does nothing if the index was
+        refreshed less than `refresh_interval` seconds ago, unless `force`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._refreshed < self.refresh_interval:
+                return 0
+            if not self.root.is_dir():
+                return 0
+            conn = self._connect()
+            found = self._walk()
+            known = {
+                path: (file_id, mtime_ns, size)
+                for file_id, path, mtime_ns, size in conn.execute(
+                    "SELECT id, path, mtime_ns, size FROM files"
+                )
+            }
+            changed = [
+                path
+                for path, st in found.items()
+                if known.get(path, (None,))[1:] != (st.st_mtime_ns, st.st_size)
+            ]
+            removed = [known[path][0] for path in known.keys() - found.keys()]
+            if changed or removed:
+                self._update(conn, changed, found, removed)
+            self._refreshed = now
+            return len(changed)
+
+    def _update(self, conn, changed, found, removed) -> None:
+        documents = {}
+        for path in changed:
+            try:
+                data = Path(path).read_bytes()
+            except FileNotFoundError:
+                continue
+            relative = Path(path).relative_to(self.root)
+            documents[path] = _parse(relative, data)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for file_id in removed:
+                self._delete_chunks(conn, file_id)
+                conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            for path, document in documents.items():
+                st = found[path]
+                (file_id,) = conn.execute(
+                    """
+                    INSERT INTO files (path, mtime_ns, size, kind, repo,
+                                       session_id, title, turns, last_status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (path) DO UPDATE SET
+                        mtime_ns = excluded.mtime_ns,
+                        size = excluded.size,
+                        kind = excluded.kind,
+                        repo = excluded.repo,
+                        session_id = excluded.session_id,
+                        title = excluded.title,
+                        turns = excluded.turns,
+                        last_status = excluded.last_status
+                    RETURNING id
+                    """,
+                    (
+                        path,
+                        st.st_mtime_ns,
+                        st.st_size,
+                        document.kind,
+                        document.repo,
+                        document.session_id,
+                        document.title,
+                        document.turns,
+                        document.last_status,
+                    ),
+                ).fetchone()
+                self._delete_chunks(conn, file_id)
+                conn.executemany(
+                    "INSERT INTO chunks (rowid, title, body, turn, status)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (
+                            file_id << _CHUNK_BITS | n,
+                            chunk.title,
+                            chunk.body,
+                            chunk.turn,
+                            chunk.status,
+                        )
+                        for n, chunk in enumerate(document.chunks)
+                    ),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _delete_chunks(conn, file_id: int) -> None:
+        conn.execute(
+            "DELETE FROM chunks WHERE rowid >= ? AND rowid < ?",
+            (file_id << _CHUNK_BITS, (file_id + 1) << _CHUNK_BITS),
+        )
+
+    @staticmethod
+    def _filters(
+        repo: str | None,
+        session_id: str | None,
+        since: str | None,
+        until: str | None,
+    ) -> tuple[list[str], list]:
+        clauses, params = [], []
+        if repo is not None:
+            clauses.append("f.repo = ?")
+            params.append(repo)
+        if session_id is not None:
+            # Session IDs prefix the Session Log name, so match by prefix.
+            clauses.append("substr(f.session_id, 1, ?) = ?")
+            params += [len(session_id), session_id]
+        if since is not None:
+            clauses.append("f.mtime_ns >= ?")
+            params.append(_timestamp_ns(since))
+        if until is not None:
+            clauses.append("f.mtime_ns < ?")
+            params.append(_timestamp_ns(until, end=True))
+        return clauses, params
+
+    def search(
+        self,
+        query: str,
+        *,
+        repo: str | None = None,
+        session_id: str | None = None,
+        status: str | None = None,
+        kind: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int = 10,
+    ) -> list[dict]:
+        """
+        Returns the best matches for an FTS5 `query`, best first.
+
+        `since` and `until` are ISO dates or date-times compared with the
+        files' modification times; a date-only `until` includes that day.
+        """
+        self.refresh()
+        if not self.root.is_dir():
+            return []
+        clauses, params = self._filters(repo, session_id, since, until)
+        if status is not None:
+            clauses.append("c.status = ?")
+            params.append(status)
+        if kind is not None:
+            clauses.append("f.kind = ?")
+            params.append(kind)
+        sql = f"""
+            SELECT f.path, f.kind, f.repo, f.session_id, f.mtime_ns, c.turn,
+                   c.status, snippet(chunks, -1, '**', '**', '...', ?),
+                   bm25(chunks, 4.0, 1.0) AS rank
+            FROM chunks c JOIN files f ON f.id = c.rowid >> {_CHUNK_BITS}
+            WHERE chunks MATCH ? {"".join(" AND " + c for c in clauses)}
+            ORDER BY rank LIMIT ?
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    sql, (SNIPPET_TOKENS, query, *params, limit)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                # Not valid FTS5 syntax: search for the words instead.
+                words = _fts_query(query)
+                if not words:
+                    return []
+                try:
+                    rows = conn.execute(
+                        sql, (SNIPPET_TOKENS, words, *params, limit)
+                    ).fetchall()
+                except sqlite3.OperationalError as e:
+                    raise SearchError(f"Cannot search for {query!r}: {e}")
+        return [
+            {
+                "path": path,
+                "kind": kind,
+                "repo": repo,
+                "session_id": session_id,
+                "modified": _iso(mtime_ns),
+                "turn": turn,
+                "status": status,
+                "snippet": snippet,
+                "score": round(-rank, 3),
+            }
+            for path, kind, repo, session_id, mtime_ns, turn, status, snippet, rank in rows
+        ]
+
+    def list_sessions(
+        self,
+        *,
+        repo: str | None = None,
+        session_id: str | None = None,
+        status: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int = 20,
+    ) -> list[dict]:
+        """Returns the Session Logs matching the filters, most recent first."""
+        self.refresh()
+        if not self.root.is_dir():
+            return []
+        clauses, params = self._filters(repo, session_id, since, until)
+        clauses.append("f.kind = ?")
+        params.append(SESSION_LOG)
+        if status is not None:
+            clauses.append("f.last_status = ?")
+            params.append(status)
+        sql = f"""
+            SELECT f.path, f.repo, f.session_id, f.title, f.turns,
+                   f.last_status, f.mtime_ns
+            FROM files f WHERE {" AND ".join(clauses)}
+            ORDER BY f.mtime_ns DESC LIMIT ?
+        """
+        with self._lock:
+            rows = self._connect().execute(sql, (*params, limit)).fetchall()
+        return [
+            {
+                "path": path,
+                "repo": repo,
+                "session_id": session_id,
+                "title": title,
+                "turns": turns,
+                "last_status": last_status,
+                "modified": _iso(mtime_ns),
+            }
+            for path, repo, session_id, title, turns, last_status, mtime_ns in rows
+        ]
+
+
+_indexes: dict[Path, SessionIndex] = {}
+
+
+def open_index(root: str | Path | None = None) -> SessionIndex:
+    """Returns the process-wide index of `root` (default: the tasks directory)."""
+    path = Path(root).expanduser() if root is not None else tasks_root()
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes[path] = SessionIndex(path)
+    return index
@@ -0,0 +1,272 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Append-only access to SuperAgent Session Logs.
+
+Every specialist appends exactly one turn to the shared Session Log. Rather
+than reading the whole file back and rewriting it, a turn is appended under an
+exclusive `flock` so that concurrent specialists are serialized and never drop
+each other's entries. The cost of an append is proportional to the size of the
+new entry, not to the length of the log: the turn number comes from the
+sidecar turn index (see `turn_index`), which is updated on every append.
+
+Durability uses group commit: an append waits for an `fsync` that starts after
+its write, and appends that complete while an `fsync` is in flight all share
+the next one, so a lone append is never delayed.
+"""
+
+import asyncio
+import errno
+import os
+import re
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from gemini_cli_mcp.turn_index import TurnIndex
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows. This module (and the search index, which only
+    # reads Session Logs) can still be imported; locking raises instead.
+    fcntl = None
+
+_FIELD_RE = re.compile(r"^\*\*(\w+):\*\* ?(.*)$")
+# Lines of a field value that would read as a turn header or a field label are
+# prefixed with a backslash, so that they cannot start a phantom turn.
+# Already-escaped lines get one more, so unescaping is exact.
+_MARKUP_RE = re.compile(r"^(\\*(?:### Turn \d+:|\*\*\w+:\*\*))", re.MULTILINE)
+_ESCAPED_RE = re.compile(r"^\\(\\*(?:### Turn \d+:|\*\*\w+:\*\*))", re.MULTILINE)
+
+
+def _escape(value: str) -> str:
+    return _MARKUP_RE.sub(r"\\\1", value)
+
+
+def _unescape(value: str) -> str:
+    return _ESCAPED_RE.sub(r"\1", value)
+
+
+@dataclass
+class TurnEntry:
+    """A single entry in the `Agent Work Log`."""
+
+    agent_id: str
+    status: str
+    prompt: str
+    thought: str
+    action: str
+    observation: str
+    summary: str
+
+    def render(self, number: int) -> str:
+        """Renders the entry using the Agent Log Entry Template."""
+        return (
+            f"### Turn {number}: {_escape(self.agent_id)}\n"
+            f"**Status:** {_escape(self.status)}\n"
+            f"**Prompt:** {_escape(self.prompt)}\n"
+            f"**Thought:** {_escape(self.thought)}\n"
+            f"**Action:** {_escape(self.action)}\n"
+            f"**Observation:** {_escape(self.observation)}\n"
+            f"**Summary:** {_escape(self.summary)}\n"
+        )
+
+    @classmethod
+    def parse(cls, text: str) -> "TurnEntry":
+        """
+        Parses the Markdown of a rendered turn back into an entry.
+
+        Fields may span several lines; missing fields are left empty.
+        """
+        lines = text.strip().splitlines()
+        agent_id = _unescape(lines[0].split(":", 1)[-1].strip()) if lines else ""
+        fields: dict[str, list[str]] = {}
+        current = None
+        for line in lines[1:]:
+            match = _FIELD_RE.match(line)
+            if match:
+                current = fields.setdefault(match.group(1).lower(), [])
+                current.append(match.group(2))
+            elif current is not None:
+                current.append(line)
+        values = {
+            name: _unescape("\n".join(value).strip()) for name, value in fields.items()
+        }
+        return cls(
+            agent_id,
+            *(
+                values.get(name, "")
+                for name in (
+                    "status",
+                    "prompt",
+                    "thought",
+                    "action",
+                    "observation",
+                    "summary",
+                )
+            ),
+        )
+
+
+def resolve_path(path: str) -> str:
+    """Expands `~` and returns the absolute path of a Session Log."""
+    return os.path.abspath(os.path.expanduser(path))
+
+
+@contextmanager
+def locked(path: str, flags: int = os.O_RDONLY) -> Iterator[int]:
+    """
+    Opens `path` and holds an exclusive `flock` on it for the duration.
+
+    Every writer of a Session Log (and every reader that may rebuild its turn
+    index) goes through this lock. Compaction replaces a log by renaming a new
+    file over it, so once the lock is held the file is checked to still be the
+    one at `path`; if it was replaced in the meantime, the new one is locked
+    instead.
+    """
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "Session Logs require POSIX file locking")
+    while True:
+        fd = os.open(path, flags)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if _is_current(fd, path):
+                break
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+    try:
+        yield fd
+    finally:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def _is_current(fd: int, path: str) -> bool:
+    """Returns whether the file open on `fd` is still the one at `path`."""
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        return False
+    st = os.fstat(fd)
+    return (st.st_dev, st.st_ino) == (current.st_dev, current.st_ino)
+
+
+class SessionLog:
+    """An append-only Session Log file shared by the strategist and specialists."""
+
+    def __init__(self, path: str):
+        self.path = resolve_path(path)
+        self.index = TurnIndex(self.path)
+        # The fsync in flight, and the next one that new appends will join.
+        self._syncing: asyncio.Future | None = None
+        self._pending_sync: asyncio.Future | None = None
+
+    async def append(self, entry: TurnEntry) -> int:
+        """
+        Appends `entry` as the next turn and waits until it is durable.
+
+        Returns the turn number assigned to the entry.
+        """
+        number = await asyncio.to_thread(self._append_locked, entry)
+        await self._sync()
+        return number
+
+    async def read_turns(
+        self,
+        *,
+        start: int | None = None,
+        end: int | None = None,
+        status: str | None = None,
+        last: int | None = None,
+    ) -> list[str]:
+        """
+        Returns the Markdown text of the matching turns, oldest first.
+
+        Turns are selected by the inclusive turn-number range `start`..`end`
+        and by `status`; `last` keeps only the most recent matches.
+        """
+        return await asyncio.to_thread(self._read_locked, start, end, status, last)
+
+    def _read_locked(self, start, end, status, last) -> list[str]:
+        with locked(self.path) as fd, self.index.lookup(fd) as view:
+            positions = view.positions(start, end, status)
+            if last is not None:
+                positions = positions[-last:] if last else []
+            return [view.text(i) for i in positions]
+
+    def _append_locked(self, entry: TurnEntry) -> int:
+        # The log is created by the strategist from the Master Template, so a
+        # missing file is an error rather than something to create here.
+        with locked(self.path, os.O_RDWR | os.O_APPEND) as fd:
+            number = self.index.last_turn(self.index.sync(fd)) + 1
+            size = os.fstat(fd).st_size
+            prefix = ""
+            if size > 0:
+                prefix = "\n" if os.pread(fd, 1, size - 1) == b"\n" else "\n\n"
+            data = (prefix + entry.render(number)).encode("utf-8")
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+            self.index.sync(fd)
+            return number
+
+    async def _sync(self) -> None:
+        batch = self._pending_sync
+        if batch is None:
+            batch = self._pending_sync = asyncio.ensure_future(
+                self._fsync_batch(self._syncing)
+            )
+        await asyncio.shield(batch)
+
+    async def _fsync_batch(self, previous: asyncio.Future | None) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        # Appends written after this point join the next batch.
+        self._pending_sync = None
+        self._syncing = asyncio.current_task()
+        try:
+            await asyncio.to_thread(_fsync_path, self.path)
+        finally:
+            if self._syncing is asyncio.current_task():
+                self._syncing = None
+
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_logs: dict[str, SessionLog] = {}
+
+
+def open_log(path: str) -> SessionLog:
+    """
+    Returns the shared `SessionLog` for `path`.
+
+    Reusing one instance per file lets concurrent appends share fsync batches.
+    """
+    resolved = resolve_path(path)
+    log = _logs.get(resolved)
+    if log is None:
+        log = _logs[resolved] = SessionLog(resolved)
+    return log
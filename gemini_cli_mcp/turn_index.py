@@ -0,0 +1,284 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Turn-offset index for Session Logs.
+
+Each Session Log has a sidecar file (`<session log>.idx`) holding one
+fixed-width record per `### Turn <N>:` header: the byte offset of the header,
+the turn number and the turn's status. Turns are then served as slices of the
+memory-mapped log, so reading the last few turns, a range of turns, or every
+turn with a given status never scans the log itself.
+
+The sidecar records the size and mtime of the log it describes. When the log
+has only grown since then, the new bytes are scanned and appended to the
+index; when it was rewritten in a way that moved existing turns, or the
+sidecar is missing or corrupt, the index is rebuilt from the turn headers.
+
+All functions taking a file descriptor expect the caller to hold an exclusive
+`flock` on the Session Log.
+"""
+
+import mmap
+import os
+import re
+import struct
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from typing import Literal, get_args
+
+TurnStatus = Literal[
+    "IN_PROGRESS",
+    "COMPLETED",
+    "FAILED",
+    "REQUIRES_STRATEGIST_INTERVENTION",
+]
+STATUSES: tuple[str, ...] = get_args(TurnStatus)
+
+TURN_HEADER_RE = re.compile(rb"^### Turn (\d+):", re.MULTILINE)
+STATUS_RE = re.compile(rb"^\*\*Status:\*\* *([A-Z_]+)", re.MULTILINE)
+
+INDEX_SUFFIX = ".idx"
+
+_MAGIC = b"SLIX"
+_VERSION = 1
+# magic, version, indexed log size, indexed log mtime (ns), record count
+_HEADER = struct.Struct("<4sI QqQ")
+# header offset, turn number, status code
+_RECORD = struct.Struct("<QIB3x")
+
+_UNKNOWN_STATUS = 0xFF
+_STATUS_CODES = {status.encode(): code for code, status in enumerate(STATUSES)}
+
+
+@dataclass(frozen=True)
+class _Header:
+    log_size: int
+    log_mtime_ns: int
+    count: int
+
+
+def index_path(log_path: str) -> str:
+    """Returns the path of the sidecar index for a Session Log."""
+    return log_path + INDEX_SUFFIX
+
+
+def status_code(status: str) -> int:
+    """Returns the code stored in the index for `status`."""
+    return _STATUS_CODES.get(status.encode(), _UNKNOWN_STATUS)
+
+
+def _map(fd: int, size: int) -> mmap.mmap | None:
+    return mmap.mmap(fd, size, access=mmap.ACCESS_READ) if size else None
+
+
+def _scan(data: mmap.mmap, start: int, end: int) -> Iterator[tuple[int, int, int]]:
+    """Yields `(offset, turn, status)` for every turn header in `data[start:end]`."""
+    headers = list(TURN_HEADER_RE.finditer(data, start, end))
+    for i, match in enumerate(headers):
+        entry_end = headers[i + 1].start() if i + 1 < len(headers) else end
+        code = _UNKNOWN_STATUS
+        status = STATUS_RE.search(data, match.end(), entry_end)
+        if status:
+            code = _STATUS_CODES.get(status.group(1), _UNKNOWN_STATUS)
+        yield match.start(), int(match.group(1)), code
+
+
+class TurnIndex:
+    """The sidecar turn-offset index of a single Session Log."""
+
+    def __init__(self, log_path: str):
+        self.log_path = log_path
+        self.path = index_path(log_path)
+
+    def sync(self, fd: int) -> _Header:
+        """Brings the index up to date with the log open on `fd`."""
+        st = os.fstat(fd)
+        header = self._read_header()
+        if header is not None:
+            if header.log_size == st.st_size and header.log_mtime_ns == st.st_mtime_ns:
+                return header
+            if header.log_size <= st.st_size and self._still_valid(fd, header):
+                return self._catch_up(fd, header, st)
+        return self._rebuild(fd, st)
+
+    def last_turn(self, header: _Header) -> int:
+        """Returns the number of the last indexed turn, or 0 if there is none."""
+        if header.count == 0:
+            return 0
+        with open(self.path, "rb") as f:
+            return self._record(f, header.count - 1)[1]
+
+    def lookup(self, fd: int) -> "TurnView":
+        """Syncs the index and returns a view for reading turns from the log."""
+        header = self.sync(fd)
+        return TurnView(fd, self.path, header)
+
+    def shift(self, fd: int, header: _Header, at: int, delta: int) -> _Header:
+        """
+        Accounts for `delta` bytes inserted into the log at offset `at`.
+
+        `header` must describe the log as it was just before the insertion.
+        Moving the indexed offsets avoids rescanning the log for its turns.
+        """
+        st = os.fstat(fd)
+        with open(self.path, "r+b") as f:
+            f.seek(_HEADER.size)
+            raw = f.read(header.count * _RECORD.size)
+            records = [
+                (offset + delta if offset >= at else offset, turn, code)
+                for offset, turn, code in _RECORD.iter_unpack(raw)
+            ]
+            updated = _Header(st.st_size, st.st_mtime_ns, header.count)
+            f.seek(0)
+            f.write(self._pack_header(updated))
+            f.write(b"".join(_RECORD.pack(*record) for record in records))
+        return updated
+
+    def _read_header(self) -> _Header | None:
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read(_HEADER.size)
+                size = os.fstat(f.fileno()).st_size
+        except FileNotFoundError:
+            return None
+        if len(raw) != _HEADER.size:
+            return None
+        magic, version, log_size, log_mtime_ns, count = _HEADER.unpack(raw)
+        if magic != _MAGIC or version != _VERSION:
+            return None
+        if size < _HEADER.size + count * _RECORD.size:
+            return None
+        return _Header(log_size, log_mtime_ns, count)
+
+    def _record(self, f, i: int) -> tuple[int, int, int]:
+        f.seek(_HEADER.size + i * _RECORD.size)
+        return _RECORD.unpack(f.read(_RECORD.size))
+
+    def _still_valid(self, fd: int, header: _Header) -> bool:
+        """Checks that the first and last indexed turns have not moved."""
+        if header.count == 0:
+            return True
+        with open(self.path, "rb") as f:
+            records = [self._record(f, 0), self._record(f, header.count - 1)]
+        for offset, turn, _ in records:
+            expected = f"### Turn {turn}:".encode()
+            if os.pread(fd, len(expected), offset) != expected:
+                return False
+            if offset > 0 and os.pread(fd, 1, offset - 1) != b"\n":
+                return False
+        return True
+
+    def _catch_up(self, fd: int, header: _Header, st: os.stat_result) -> _Header:
+        data = _map(fd, st.st_size)
+        try:
+            new = list(_scan(data, header.log_size, st.st_size)) if data else []
+        finally:
+            if data is not None:
+                data.close()
+        updated = _Header(st.st_size, st.st_mtime_ns, header.count + len(new))
+        with open(self.path, "r+b") as f:
+            f.seek(_HEADER.size + header.count * _RECORD.size)
+            f.write(b"".join(_RECORD.pack(*record) for record in new))
+            f.truncate()
+            f.seek(0)
+            f.write(self._pack_header(updated))
+        return updated
+
+    def _rebuild(self, fd: int, st: os.stat_result) -> _Header:
+        data = _map(fd, st.st_size)
+        try:
+            records = list(_scan(data, 0, st.st_size)) if data else []
+        finally:
+            if data is not None:
+                data.close()
+        header = _Header(st.st_size, st.st_mtime_ns, len(records))
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._pack_header(header))
+            f.write(b"".join(_RECORD.pack(*record) for record in records))
+        os.replace(tmp_path, self.path)
+        return header
+
+    @staticmethod
+    def _pack_header(header: _Header) -> bytes:
+        return _HEADER.pack(
+            _MAGIC, _VERSION, header.log_size, header.log_mtime_ns, header.count
+        )
+
+
+class TurnView:
+    """Memory-mapped, read-only access to the turns of an indexed Session Log."""
+
+    def __init__(self, fd: int, index_path: str, header: _Header):
+        self._header = header
+        self._log = _map(fd, header.log_size)
+        with open(index_path, "rb") as f:
+            size = _HEADER.size + header.count * _RECORD.size
+            self._index = _map(f.fileno(), size)
+
+    def __enter__(self) -> "TurnView":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for mapped in (self._log, self._index):
+            if mapped is not None:
+                mapped.close()
+
+    def __len__(self) -> int:
+        return self._header.count
+
+    def _record(self, i: int) -> tuple[int, int, int]:
+        return _RECORD.unpack_from(self._index, _HEADER.size + i * _RECORD.size)
+
+    def _bisect(self, turn: int) -> int:
+        """Returns the position of the first record whose turn is >= `turn`."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[1] < turn:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def positions(
+        self,
+        start: int | None = None,
+        end: int | None = None,
+        status: str | None = None,
+    ) -> Sequence[int]:
+        """Returns the record positions matching a turn range and status."""
+        lo = 0 if start is None else self._bisect(start)
+        hi = len(self) if end is None else self._bisect(end + 1)
+        if status is None:
+            return range(lo, hi)
+        code = status_code(status)
+        records = memoryview(self._index)[
+            _HEADER.size + lo * _RECORD.size : _HEADER.size + hi * _RECORD.size
+        ]
+        try:
+            return [
+                lo + i
+                for i, (_, _, record_code) in enumerate(_RECORD.iter_unpack(records))
+                if record_code == code
+            ]
+        finally:
+            records.release()
+
+    def text(self, i: int) -> str:
+        """Returns the Markdown text of the turn at record position `i`."""
+        offset = self._record(i)[0]
+        end = self._record(i + 1)[0] if i + 1 < len(self) else self._header.log_size
+        return self._log[offset:end].decode("utf-8").rstrip()
@@ -12,141 +12,298 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import os
+from contextlib import contextmanager
+from pathlib import Path
 from typing import Annotated
 
 from fastmcp import Context, FastMCP
+from fastmcp.exceptions import ToolError
 from pydantic import Field
 
-mcp = FastMCP("SuperAgent Server")
+from gemini_cli_mcp.checkpoints import GitError, open_repository
+from gemini_cli_mcp.compaction import (
+    DEFAULT_BUDGET,
+    DEFAULT_WINDOW,
+    compact,
+    schedule_compaction,
+)
+from gemini_cli_mcp.metrics import add_metrics
+from gemini_cli_mcp.plan_tools import SessionLogPath, add_plan_tools
+from gemini_cli_mcp.prompt_templates import PromptTemplate
+from gemini_cli_mcp.result_cache import open_cache
+from gemini_cli_mcp.scheduler import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    SpecialistResult,
+    SpecialistTask,
+    run_batch,
+)
+from gemini_cli_mcp.search_tools import add_search_tools
+from gemini_cli_mcp.session_log import TurnEntry, open_log
+from gemini_cli_mcp.turn_index import TurnStatus
 
+mcp = FastMCP("SuperAgent Server")
+add_metrics(mcp)
+add_plan_tools(mcp)
+add_search_tools(mcp)
+
+TEMPLATES = Path(__file__).resolve().parent / "templates"
+SUPERAGENT_PROMPT = PromptTemplate(TEMPLATES / "superagent.md")
+
+
+@mcp.tool
+async def append_turn(
+    session_log: SessionLogPath,
+    agent_id: Annotated[str, Field(description="Your Agent-ID, e.g. 'Strategist'.")],
+    status: TurnStatus,
+    prompt: Annotated[
+        str, Field(description="Path to the prompt file you are executing.")
+    ],
+    thought: Annotated[str, Field(description="Your reasoning and analysis.")],
+    action: Annotated[str, Field(description="A summary of the action taken.")],
+    observation: Annotated[
+        str, Field(description="The results or output of your action.")
+    ],
+    summary: Annotated[str, Field(description="A brief summary of your turn.")],
+) -> dict:
+    """
+    Appends a turn to the `Agent Work Log` of a Session Log.
 
-@mcp.prompt
-async def superagent(prompt: str) -> str:
+    The turn number is assigned automatically. The file is locked for the
+    duration of the append, so concurrent agents never lose each other's
+    entries, and previous entries are never rewritten. Once the log grows past
+    its byte budget, older completed turns are compacted in the background.
     """
-    Acts as a master strategist AI developer to accomplish a user task.
+    entry = TurnEntry(agent_id, status, prompt, thought, action, observation, summary)
+    log = open_log(session_log)
+    try:
+        number = await log.append(entry)
+    except FileNotFoundError:
+        raise ToolError(f"Session Log not found: {log.path}")
+    schedule_compaction(log.path)
+    return {"session_log": log.path, "turn": number}
+
+
+@mcp.tool
+async def read_turns(
+    session_log: SessionLogPath,
+    last: Annotated[
+        int | None,
+        Field(
+            ge=0,
+            description="Return only the N most recent matching turns. "
+            "Defaults to 5 when neither a turn range nor a status is given.",
+        ),
+    ] = None,
+    start: Annotated[
+        int | None, Field(description="First turn number to return (inclusive).")
+    ] = None,
+    end: Annotated[
+        int | None, Field(description="Last turn number to return (inclusive).")
+    ] = None,
+    status: Annotated[
+        TurnStatus | None, Field(description="Return only turns with this status.")
+    ] = None,
+) -> str:
     """
-    prompt_text = """
-You are a master strategist AI developer, following an **Analyze -> Decide -> Formulate -> Delegate** loop. Your entire workflow is managed within a single, continuous Markdown file (the "Session Log").
-
-Your goal is to accomplish the user task: --->>>{args}<<<---.
-
-You will achieve this by:
-1.  First, fully understanding the user's query and objectives with clear success criteria, definitions of done, and what is in-scope and out-of-scope.
-2.  Breaking down the task into small, atomic subtasks. An atomic subtask is a unit of work that can be independently designed, implemented, verified, and integrated.
-3.  Spawning specialist agents to execute atomic tasks like analysis, debugging, implementation, and verification.
-4.  Ensuring all agents, including yourself, share knowledge in a common log as you progress towards the user's goal.
-5.  Maintaining awareness of the system state and reacting to any changes or deviations from the goal.
-6.  Maintain regular checkpoints (via git) to ensure we always have a working state to fall back on if something goes wrong.
-
-### Core Workflow
-
-1.  **Initialization (Your First Turn Only):**
-    *   Create a new, unique "Session ID" for the current session, including the current timestamp (use the `time` mcp server). This will be identified as `session_id`.
-    *   Create a new, unique "Session Log" file: `~/tmp/gemini-tasks/<repo_or_folder_name>/<session_id_incl_timestamp>-<task_description>.md`.
-    *   Use the "Master Template for a NEW Session Log" below to structure and populate the file, including the `session_id`.
-    *   Define the `Overall Goal` with detailed success criteria. If the user's request is ambiguous, ask clarifying questions before proceeding.
-    *   Create an initial, evolving `Master Plan` with checkboxes. This plan MUST break down the Overall Goal into the smallest possible atomic subtasks.
-    *   Log your first turn under `Agent Work Log`, stating your plan and the command for the first specialist. This entry should be comprehensive, detailing your initial analysis, the chosen approach, and the specific task delegated to the first specialist.
-
-2.  **Orchestration (All Subsequent Turns):**
-    *   **Analyze:** Read the `Master Plan` and the most recent entries in the `Agent Work Log` (e.g., the last 3-5 turns) to understand the current state, the last specialist's actions, and what remains to be done. **This avoids re-reading the entire log, which can become slow and token-intensive.** Adjust the plan as needed, ensuring all new tasks remain atomic.
-    *   **Decide:** Determine the next logical step. When a task is complete, update the `Master Plan` by changing `[ ]` to `[x]`. Decide if the work needs immediate verification.
-    *   **Formulate:** Craft a precise prompt for the next specialist agent using the "Prompt Engineering Best Practices" below and save it to a file. The prompt should include the files the agent needs to write to and instructions for updating its progress.
-    *   **Delegate & Execute:** Append your new turn to the `Agent Work Log`. In the `Next Step` block, summarize the prompt for the specialist agent. As your final action, invoke the specialist using the `shell` tool, passing the contents of the prompt file to the `gemini` command for execution in a new session.
-    *   **Await Control:** Wait for the specialist agent to complete its work and hand control back to you. Then, repeat the process for the next turn.
-
-### Specialist Delegation & Invocation
-
-To delegate a task, formulate a prompt for a specialist and save it to a file. The suggested file path is: `~/tmp/gemini-tasks/<repo_or_folder_name>/<session_id>/prompt-<task_or_turn_number>-<task_name>-<specialist_name>.md`.
-
-Then, invoke the specialist using the `shell` tool with the following command:
-`gemini -y -i "Please execute the instructions in <path_to_prompt_file>"`
-
-This will invoke the specialist in interactive mode and YOLO mode and instruct it to read and execute the instructions from the prompt file.
-
-**Note on `-y` (YOLO mode):** This is high-risk as it bypasses confirmation. Your `Master Plan` should include explicit "Verification" steps for any specialist task that involves destructive shell commands (e.g. `rm`, `git push`, database modifications).
-
----
-### Prompt Engineering Best Practices (For Crafting Specialist Prompts)
-
-You MUST follow these 5 rules when creating a prompt for a specialist:
-
-1.  **Persona:** Start the prompt by defining the specialist's role (e.g., "You are a senior database engineer...").
-2.  **Context:** Provide all necessary background information from the `Agent Work Log`.
-3.  **Detailed Rules:** Give clear, explicit instructions and constraints (e.g., "Modify only the `*.js` files," "Do not use external libraries").
-4.  **Goal & Session Log:** Clearly state the final goal for the task. Crucially, you MUST instruct the specialist agent to read and adhere to the **Instructions for All Agents** section within the Session Log file for all operational protocols.
-5.  **Task-Focused Instructions:** Keep the prompt focused on the specific task. Do not repeat the general instructions that are already present in the Session Log.
-6.  **Atomic Scope:** Clearly state that the task is an 'atomic unit of work' and the specialist must not exceed this scope. Instruct them to report any required work that is outside this scope back to the Strategist (using the `REQUIRES_STRATEGIST_INTERVENTION` status) instead of doing it.
-
----
-### General Rules & Protocols
-
-*   **Proactiveness:** Be proactive and take the initiative. Do not ask for permission for every step. If a decision is within the scope of your role as a master strategist, make it and proceed.
-*   **Task Atomicity (CRITICAL):**
-    *   **Strategist:** You are responsible for breaking down the `Master Plan` into atomic subtasks.
-    *   **Specialists:** Specialists are responsible for executing **only** the atomic subtask they are given.
-    *   **Reporting Scope Creep: If a specialist discovers that a task is more complex than anticipated or requires work outside its defined scope, it must **STOP**. It should not attempt the extra work. Instead, it must report this finding in its log entry using the `REQUIRES_STRATEGIST_INTERVENTION` status and hand control back to you, the Strategist.
-*   **State Saving:** After every *successful* specialist turn, you MUST save the system state by creating a Git commit. The commit message should summarize the specialist's action. (Initialize a Git repo *only* if one doesn't exist).
-*   **Verification:** For critical tasks, after a specialist completes their work, delegate to a "Verifier" agent to check the work against the user's goal.
-*   **Error Handling:** If a specialist `FAILED`, analyze the error in their log. You may retry once with a corrected prompt. If it fails again, update the `Master Plan` and devise a new strategy.
-*   **Handoff:** Specialists do not delegate. They must terminate after executing their command and writing sufficient handoff notes for you.
-*   **Provenance:** The history of the system's state, as recorded in the logs, must not be altered in a way that obscures what was observed or what changes were made.
+    Returns turns of the `Agent Work Log` as Markdown, oldest first.
 
----
-### Master Template for a NEW Session Log
-
-```markdown
-# SuperAgent Session: <A brief, kebab-case name for the mission>
-
-**Session ID:** <session_id>
-**Datetime:** <full date time>
-
-**Overall Goal:** This section should contain a detailed description of the user's intent and the expected outcome.
-**Approach:** This section should summarize your thinking on how you intend to satisfy the user's request.
-
----
-## Instructions for All Agents
-
-**You are a specialist agent. This file is your Session Log. You MUST follow these rules:**
+    Turns are looked up through an index kept next to the Session Log, so the
+    cost does not grow with the length of the log. By default the 5 most
+    recent turns are returned; use `start`/`end` for a range of turns and
+    `status` to find, e.g., every `FAILED` turn.
+    """
+    if last is None and start is None and end is None and status is None:
+        last = 5
+    log = open_log(session_log)
+    try:
+        turns = await log.read_turns(start=start, end=end, status=status, last=last)
+    except FileNotFoundError:
+        raise ToolError(f"Session Log not found: {log.path}")
+    return "\n\n".join(turns)
+
+
+@mcp.tool
+async def compact_session_log(
+    session_log: SessionLogPath,
+    window: Annotated[
+        int,
+        Field(ge=1, description="Number of most recent turns always kept live."),
+    ] = DEFAULT_WINDOW,
+    budget: Annotated[
+        int,
+        Field(ge=0, description="Target size of the live Session Log, in bytes."),
+    ] = DEFAULT_BUDGET,
+) -> dict:
+    """
+    Moves old `COMPLETED` turns from the `Agent Work Log` to the archive.
+
+    The turns are appended verbatim to `<session log>.archive.md`, which is
+    never rewritten and can be read with `read_turns`, and are merged into the
+    single, size-bounded rollup (statuses, agents, recent files touched, key
+    observations and a link to the archive) of the `Compacted Turns` section.
+    Turns that are not `COMPLETED` and the most recent `window` turns stay in
+    the live log unless it is still over `budget`, rollup included, in which
+    case older completed turns in the window are compacted too.
+    """
+    try:
+        result = await asyncio.to_thread(
+            compact, session_log, window=window, budget=budget
+        )
+    except FileNotFoundError:
+        raise ToolError(f"Session Log not found: {session_log}")
+    return result.to_dict()
+
+
+RepoPath = Annotated[
+    str, Field(description="Path of the git repository (or any path inside it).")
+]
+
+
+@contextmanager
+def _git_errors():
+    try:
+        yield
+    except (GitError, ValueError) as e:
+        raise ToolError(str(e))
+
+
+@mcp.tool
+async def checkpoint(
+    repo: RepoPath,
+    paths: Annotated[
+        list[str],
+        Field(
+            min_length=1,
+            description="Files and directories the specialist touched, relative "
+            "to the repository root. Deleted files are removed from the commit.",
+        ),
+    ],
+    message: Annotated[
+        str, Field(min_length=1, description="Commit message for this turn.")
+    ],
+    name: Annotated[
+        str | None,
+        Field(description="Name to roll back to later, e.g. 'turn-12'."),
+    ] = None,
+) -> dict:
+    """
+    Saves the state of the given paths as a git commit on top of `HEAD`.
 
-* **Agent Log Integrity (CRITICAL):** To add your turn to the `Agent Work Log`, you MUST follow this procedure exactly:
-    1.  **Read:** Use the `read_file` tool to read the entire content of this Session Log file.
-    2.  **Append:** In your agent's memory, concatenate your new log entry (using the "Agent Log Entry Template") to the content you just read.
-    3.  **Write:** Use the `write_file` tool to write the *entire*, updated content back to this Session Log file.
+    Only the reported paths are committed; nothing else in the working tree or
+    the index is included. Checkpoints requested within a short window are
+    combined into one commit, and every caller gets that commit back.
+    """
+    with _git_errors():
+        repository = await asyncio.to_thread(open_repository, repo)
+        result = await repository.checkpoint(paths, message, name)
+    return result.to_dict()
 
-* **WARNING: LOCKLESS OPERATION**
-    * This is a lockless system. Your agent process **MUST** terminate immediately after a successful `write_file` operation.
-    * Do not perform *any* other actions after writing to the log. This is to prevent race conditions and log corruption.
 
+@mcp.tool
+async def list_checkpoints(repo: RepoPath) -> list[dict]:
+    """
+    Lists the named checkpoints of a repository, most recent first.
+    """
+    with _git_errors():
+        repository = await asyncio.to_thread(open_repository, repo)
+        return await asyncio.to_thread(repository.list)
 
-*   **Agent Log Entry Template (MANDATORY):**
 
-    ```markdown
-    ### Turn <N>: <Agent-ID>
-    **Status:** <IN_PROGRESS | COMPLETED | FAILED | REQUIRES_STRATEGIST_INTERVENTION>
-    **Prompt:** <The path to the prompt file which the agent is executing.>
-    **Thought:** <Your reasoning and analysis of the current state and the assigned atomic task.>
-    **Action:** <A summary of the action you are about to take.>
-    **Observation:** <The results or output of your action. Use code blocks for raw output.>
-    **Summary:** <A brief summary of your findings and the outcome of your turn. If status is REQUIRES_STRATEGIST_INTERVENTION, explain *why* here.>
-    ```
-
----
+@mcp.tool
+async def rollback_to_checkpoint(
+    repo: RepoPath,
+    name: Annotated[str, Field(description="Name of the checkpoint.")],
+) -> dict:
+    """
+    Resets `HEAD`, the index and the working tree to a named checkpoint.
 
-## Master Plan
-*(Strategist Only: This is the high-level plan, broken into atomic steps. The Strategist will update the status of each step here.)*
+    Uncommitted changes to tracked files are saved first as the
+    `pre-rollback` checkpoint; untracked files are left in place.
+    """
+    with _git_errors():
+        repository = await asyncio.to_thread(open_repository, repo)
+        return await asyncio.to_thread(repository.rollback, name)
+
+
+@mcp.tool
+async def dispatch_specialists(
+    tasks: Annotated[
+        list[SpecialistTask],
+        Field(
+            min_length=1,
+            description="Specialists to run. Each has a unique `id`, the path of "
+            "its `prompt_file`, the `depends_on` IDs that must complete first, "
+            "and optionally the `session_log` it appends its turn to.",
+        ),
+    ],
+    ctx: Context,
+    max_concurrency: Annotated[
+        int, Field(ge=1, description="Maximum number of specialists run at once.")
+    ] = DEFAULT_MAX_CONCURRENCY,
+    timeout: Annotated[
+        float, Field(gt=0, description="Time limit for each specialist, in seconds.")
+    ] = DEFAULT_TIMEOUT,
+    fail_fast: Annotated[
+        bool,
+        Field(description="Cancel the rest of the batch as soon as one fails."),
+    ] = False,
+    cwd: Annotated[
+        str | None,
+        Field(
+            description="Working directory for the specialists. Defaults to the "
+            "server's own; pass the repository path when the server is shared."
+        ),
+    ] = None,
+    use_cache: Annotated[
+        bool,
+        Field(
+            description="Reuse the stored result of an identical earlier run "
+            "(only when `cwd` is given). Set to false to force the specialists "
+            "to run."
+        ),
+    ] = True,
+) -> list[dict]:
+    """
+    Runs a batch of specialist agents, in parallel where their dependencies allow.
+
+    Each specialist runs `gemini -y -p "Please execute the instructions in
+    <prompt_file>"` as a subprocess. A specialist starts once every task in its
+    `depends_on` has COMPLETED; if one of them did not, it is SKIPPED. Returns
+    the status (COMPLETED, FAILED, TIMED_OUT, CANCELLED or SKIPPED), exit code,
+    duration and captured output of every specialist, in the order given.
+
+    When `cwd` is given, a specialist whose prompt file content and working
+    tree are identical to an earlier run that completed without changing the
+    tree is not run again: its stored result is returned with `cached` set,
+    and its stored turn is appended to `session_log` and returned as
+    `log_entry`.
+    """
 
-- [ ] *Step 1: Strategist will define this.*
-- [ ] *Step 2: Strategist will define this.*
-  - [ ] *Step 2.1: Strategist will define this.*
-  - [ ] *Step 2.2: Strategist will define this.*
-- [ ] *Step 3: Strategist will define this.*
-...
+    async def report(result: SpecialistResult) -> None:
+        cached = " (cached)" if result.cached else ""
+        await ctx.info(f"Specialist {result.id!r} finished: {result.status}{cached}")
+
+    try:
+        results = await run_batch(
+            tasks,
+            max_concurrency=max_concurrency,
+            timeout=timeout,
+            fail_fast=fail_fast,
+            cwd=cwd and os.path.expanduser(cwd),
+            on_result=report,
+            cache=open_cache() if use_cache else None,
+        )
+    except (ValueError, FileNotFoundError) as e:
+        raise ToolError(str(e))
+    return [result.to_dict() for result in results]
 
----
 
-## Agent Work Log
-*(All agents must append their entries here. Do not modify previous entries of other agents.)*
-```
-"""
-    return prompt_text.format(args=prompt)
+@mcp.prompt
+async def superagent(prompt: str) -> str:
+    """
+    Acts as a master strategist AI developer to accomplish a user task.
+    """
+    return SUPERAGENT_PROMPT.render(args=prompt)
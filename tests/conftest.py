@@ -0,0 +1,99 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from gemini_cli_mcp.session_log import TurnEntry
+
+SESSION_LOG = """\
+# Task: Example
+
+## Master Plan
+- [ ] Step 1: Explore
+- [ ] Step 2: Implement
+  - [ ] Step 2.1: Write the code
+- [ ] Step 3: Verify
+
+---
+
+## Agent Work Log
+"""
+
+# Runs the prompt file named in `gemini -y -p "Please execute the instructions
+# in <file>"` as a shell script, so each test's prompt says what the specialist
+# does.
+STUB_GEMINI = """\
+#!/bin/sh
+for last; do :; done
+exec sh "${last#Please execute the instructions in }"
+"""
+
+
+@pytest.fixture
+def session_log(tmp_path: Path) -> str:
+    """A Session Log created from the Master Template, with an empty Work Log."""
+    path = tmp_path / "session.md"
+    path.write_text(SESSION_LOG)
+    return str(path)
+
+
+def entry(n: int = 0, status: str = "COMPLETED", agent: str = "agent") -> TurnEntry:
+    return TurnEntry(
+        agent_id=agent,
+        status=status,
+        prompt=f"prompt-{n}.md",
+        thought=f"Thinking about step {n}.",
+        action=f"Edited `src/module_{n}.py`.",
+        observation=f"Observation {n}.",
+        summary=f"Summary {n}.",
+    )
+
+
+@pytest.fixture
+def stub_gemini(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Puts a stub `gemini` on PATH; returns a directory for prompt files."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    gemini = bin_dir / "gemini"
+    gemini.write_text(STUB_GEMINI)
+    gemini.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    prompts = tmp_path / "prompts"
+    prompts.mkdir()
+    return prompts
+
+
+def git(cwd: str | Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout
+
+
+@pytest.fixture
+def git_repo(tmp_path: Path) -> Path:
+    """A git repository with one commit of `a.txt` and `b.txt`."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, "init", "-q")
+    git(repo, "config", "user.email", "test@example.com")
+    git(repo, "config", "user.name", "Test")
+    (repo / "a.txt").write_text("a\n")
+    (repo / "b.txt").write_text("b\n")
+    git(repo, "add", "a.txt", "b.txt")
+    git(repo, "commit", "-q", "-m", "Initial commit")
+    return repo
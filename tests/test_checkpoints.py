@@ -0,0 +1,154 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from conftest import git
+
+from gemini_cli_mcp.checkpoints import GitError, Repository, open_repository
+
+WINDOW = 0.05
+
+
+def show(repo: Path, revision: str) -> str:
+    return git(repo, "show", revision)
+
+
+def test_commits_only_the_reported_paths(git_repo: Path):
+    (git_repo / "a.txt").write_text("a2\n")
+    (git_repo / "b.txt").write_text("b2\n")
+    (git_repo / "new").mkdir()
+    (git_repo / "new" / "c.txt").write_text("c\n")
+    (git_repo / "staged.txt").write_text("staged\n")
+    git(git_repo, "add", "staged.txt")
+
+    async def main():
+        return await Repository(str(git_repo), WINDOW).checkpoint(
+            ["a.txt", "new"], "Specialist turn 3"
+        )
+
+    checkpoint = asyncio.run(main())
+
+    assert checkpoint.changed
+    assert git(git_repo, "rev-parse", "HEAD").strip() == checkpoint.commit
+    assert show(git_repo, "HEAD:a.txt") == "a2\n"
+    assert show(git_repo, "HEAD:new/c.txt") == "c\n"
+    assert show(git_repo, "HEAD:b.txt") == "b\n"
+    assert git(git_repo, "log", "-1", "--format=%s").strip() == "Specialist turn 3"
+    # The user's own staged change and unreported edits are left alone.
+    status = git(git_repo, "status", "--porcelain")
+    assert "A  staged.txt" in status
+    assert " M b.txt" in status
+    assert "a.txt" not in status
+
+
+def test_deleted_paths_are_removed(git_repo: Path):
+    (git_repo / "b.txt").unlink()
+
+    async def main():
+        return await Repository(str(git_repo), WINDOW).checkpoint(["b.txt"], "rm")
+
+    asyncio.run(main())
+    assert git(git_repo, "ls-tree", "--name-only", "HEAD").split() == ["a.txt"]
+
+
+def test_unchanged_paths_make_no_commit(git_repo: Path):
+    head = git(git_repo, "rev-parse", "HEAD").strip()
+
+    async def main():
+        return await Repository(str(git_repo), WINDOW).checkpoint(["a.txt"], "noop")
+
+    checkpoint = asyncio.run(main())
+    assert (checkpoint.changed, checkpoint.commit) == (False, head)
+
+
+def test_concurrent_checkpoints_are_batched(git_repo: Path):
+    (git_repo / "a.txt").write_text("a2\n")
+    (git_repo / "b.txt").write_text("b2\n")
+
+    async def main():
+        repository = Repository(str(git_repo), WINDOW)
+        return await asyncio.gather(
+            repository.checkpoint(["a.txt"], "Turn 1", name="one"),
+            repository.checkpoint(["b.txt"], "Turn 2"),
+        )
+
+    first, second = asyncio.run(main())
+    assert first == second
+    assert (first.batched, first.names) == (2, ["one"])
+    assert git(git_repo, "rev-list", "--count", "HEAD").strip() == "2"
+    message = git(git_repo, "log", "-1", "--format=%B")
+    assert message.startswith("Checkpoint of 2 turns")
+    assert "Turn 1" in message and "Turn 2" in message
+    assert git(git_repo, "rev-parse", "refs/checkpoints/one").strip() == first.commit
+
+
+def test_cancelled_caller_does_not_strand_the_batch(git_repo: Path):
+    (git_repo / "a.txt").write_text("a2\n")
+    (git_repo / "b.txt").write_text("b2\n")
+
+    async def main():
+        repository = Repository(str(git_repo), WINDOW)
+        cancelled = asyncio.create_task(repository.checkpoint(["a.txt"], "one"))
+        other = asyncio.create_task(repository.checkpoint(["b.txt"], "two"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await asyncio.wait_for(other, 5)
+
+    checkpoint = asyncio.run(main())
+    assert checkpoint.changed
+    assert show(git_repo, "HEAD:b.txt") == "b2\n"
+
+
+def test_rollback_restores_a_checkpoint_and_saves_changes(git_repo: Path):
+    async def checkpoint(text: str, name: str):
+        (git_repo / "a.txt").write_text(text)
+        return await Repository(str(git_repo), WINDOW).checkpoint(
+            ["a.txt"], name, name=name
+        )
+
+    first = asyncio.run(checkpoint("one\n", "one"))
+    asyncio.run(checkpoint("two\n", "two"))
+    (git_repo / "a.txt").write_text("uncommitted\n")
+
+    repository = Repository(str(git_repo))
+    # Both were committed within the same second, so their order may tie.
+    assert {c["name"] for c in repository.list()} == {"one", "two"}
+    report = repository.rollback("one")
+
+    assert report["commit"] == first.commit
+    assert git(git_repo, "rev-parse", "HEAD").strip() == first.commit
+    assert (git_repo / "a.txt").read_text() == "one\n"
+    assert report["saved_changes"]
+    assert show(git_repo, "refs/checkpoints/pre-rollback:a.txt") == "uncommitted\n"
+
+
+def test_invalid_requests(git_repo: Path, tmp_path: Path):
+    repository = Repository(str(git_repo), WINDOW)
+
+    async def main(*args, **kwargs):
+        return await repository.checkpoint(*args, **kwargs)
+
+    with pytest.raises(ValueError, match="outside"):
+        asyncio.run(main(["../elsewhere.txt"], "x"))
+    with pytest.raises(ValueError, match="Invalid checkpoint name"):
+        asyncio.run(main(["a.txt"], "x", name="bad..name"))
+    with pytest.raises(ValueError, match="No checkpoint"):
+        repository.rollback("missing")
+    not_a_repo = tmp_path / "plain"
+    not_a_repo.mkdir()
+    with pytest.raises(GitError):
+        open_repository(str(not_a_repo))
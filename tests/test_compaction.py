@@ -0,0 +1,185 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import re
+import stat
+import threading
+from pathlib import Path
+
+import pytest
+from conftest import entry
+
+from gemini_cli_mcp import compaction
+from gemini_cli_mcp.compaction import archive_path, compact
+from gemini_cli_mcp.master_plan import PlanFile
+from gemini_cli_mcp.session_log import SessionLog
+
+
+def append(path: str, statuses: list[str]) -> None:
+    async def main():
+        log = SessionLog(path)
+        for status in statuses:
+            number = await log.append(entry(0, status))
+            # Tell the turns apart by number.
+            assert number > 0
+
+    asyncio.run(main())
+
+
+def numbers(text: str) -> list[int]:
+    return [int(n) for n in re.findall(r"^### Turn (\d+)", text, re.MULTILINE)]
+
+
+def read(path: str, **kwargs) -> list[str]:
+    return asyncio.run(SessionLog(path).read_turns(**kwargs))
+
+
+def test_old_completed_turns_move_to_the_archive(session_log: str):
+    append(session_log, ["COMPLETED"] * 3 + ["FAILED"] + ["COMPLETED"] * 6)
+    turns_before = read(session_log)
+
+    result = compact(session_log, window=4, budget=1 << 20)
+
+    assert result.compacted_turns == [1, 2, 3, 5, 6]
+    live = Path(session_log).read_text()
+    assert numbers(live) == [4, 7, 8, 9, 10]
+    archive = Path(archive_path(session_log)).read_text()
+    assert numbers(archive) == [1, 2, 3, 5, 6]
+    for turn in [turns_before[i] for i in (0, 1, 2, 4, 5)]:
+        assert turn in archive
+    # The rollup sits before the Work Log and the Master Plan still parses.
+    assert live.index("## Compacted Turns") < live.index("## Agent Work Log")
+    assert "turns 1-3, 5-6" in live
+    assert "**Status:** 5 COMPLETED" in live
+    assert len(PlanFile(session_log).load().walk()) == 4
+    # Reading and appending go on as before.
+    assert numbers("\n".join(read(session_log))) == [4, 7, 8, 9, 10]
+    append(session_log, ["COMPLETED"])
+    assert numbers(read(session_log, last=1)[0]) == [11]
+
+
+def test_budget_folds_turns_inside_the_window(session_log: str):
+    append(session_log, ["COMPLETED"] * 10)
+    result = compact(session_log, window=10, budget=2000)
+    assert result.compacted_turns
+    assert result.size_after <= 2000
+    # The last turn is always kept.
+    assert numbers(Path(session_log).read_text())[-1] == 10
+
+
+def test_nothing_to_compact(session_log: str):
+    append(session_log, ["COMPLETED"] * 3)
+    before = Path(session_log).read_bytes()
+    result = compact(session_log, window=10, budget=1 << 20)
+    assert result.compacted_turns == []
+    assert Path(session_log).read_bytes() == before
+    assert not os.path.exists(archive_path(session_log))
+
+
+def test_rollup_stays_bounded(session_log: str):
+    sizes = []
+    for _ in range(150):
+        append(session_log, ["COMPLETED"])
+        compact(session_log, window=10, budget=8000)
+        sizes.append(os.path.getsize(session_log))
+    live = Path(session_log).read_text()
+    assert live.count("### Compacted Turns") == 1
+    assert "### Compacted Turns 1-" in live
+    assert max(sizes) <= 8000
+    archive = Path(archive_path(session_log)).read_text()
+    assert numbers(archive) + numbers(live) == list(range(1, 151))
+
+
+def test_separate_rollup_blocks_are_merged(session_log: str):
+    append(session_log, ["COMPLETED"] * 12)
+    compact(session_log, window=8, budget=1 << 20)
+    # Split the rollup into two blocks, as older versions wrote them.
+    text = Path(session_log).read_text()
+    block = re.search(r"### Compacted Turns.*?\n\n", text, re.DOTALL).group(0)
+    Path(session_log).write_text(text.replace(block, block + block))
+
+    compact(session_log, window=4, budget=1 << 20)
+
+    live = Path(session_log).read_text()
+    assert live.count("### Compacted Turns") == 1
+    assert "**Status:** 12 COMPLETED" in live
+
+
+def test_futile_compactions_are_not_repeated(
+    session_log: str, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(compaction, "DEFAULT_BUDGET", 2000)
+    calls = []
+    real_compact = compaction.compact
+
+    def counting(path, **kwargs):
+        calls.append(path)
+        return real_compact(path, **kwargs)
+
+    monkeypatch.setattr(compaction, "compact", counting)
+
+    async def main():
+        log = SessionLog(session_log)
+        for i in range(100):
+            # Turns that are not COMPLETED are never compacted.
+            await log.append(entry(i, "FAILED"))
+            compaction.schedule_compaction(session_log)
+            while compaction._running:
+                await asyncio.sleep(0.001)
+
+    asyncio.run(main())
+    assert 0 < len(calls) < 20
+
+
+def test_failed_rewrite_leaves_the_log_intact(session_log: str, monkeypatch):
+    append(session_log, ["COMPLETED"] * 10)
+    before = Path(session_log).read_bytes()
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(compaction.os, "replace", fail)
+    with pytest.raises(OSError, match="disk full"):
+        compact(session_log, window=2, budget=1 << 20)
+    monkeypatch.undo()
+
+    assert Path(session_log).read_bytes() == before
+    assert not list(Path(session_log).parent.glob("*.tmp"))
+    append(session_log, ["COMPLETED"])
+    assert numbers(read(session_log, last=1)[0]) == [11]
+
+
+def test_appends_during_compaction_are_kept(session_log: str):
+    os.chmod(session_log, 0o640)
+    append(session_log, ["COMPLETED"] * 10)
+    done = threading.Event()
+
+    def writer():
+        append(session_log, ["COMPLETED"] * 40)
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not done.is_set():
+        compact(session_log, window=2, budget=1 << 20)
+    thread.join()
+    compact(session_log, window=2, budget=1 << 20)
+
+    live = numbers(Path(session_log).read_text())
+    archived = numbers(Path(archive_path(session_log)).read_text())
+    assert sorted(live + archived) == list(range(1, 51))
+    assert numbers("\n".join(read(session_log))) == live
+    assert stat.S_IMODE(os.stat(session_log).st_mode) == 0o640
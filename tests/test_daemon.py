@@ -0,0 +1,179 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import os
+import stat
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import daemon
+import pytest
+from daemon import (
+    HEALTH_PATH,
+    MCP_PATH,
+    METRICS_PATH,
+    Address,
+    add_address_arguments,
+    address_from_args,
+    auth_headers,
+    health,
+    load_token,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+COMBINED = ROOT / "combined_server"
+
+INITIALIZE = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2025-06-18",
+        "capabilities": {},
+        "clientInfo": {"name": "test", "version": "0"},
+    },
+}
+HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json, text/event-stream",
+}
+
+
+@pytest.fixture
+def state_dir(tmp_path: Path, monkeypatch) -> Path:
+    state = tmp_path / "state"
+    monkeypatch.setattr(daemon, "STATE_DIR", state)
+    monkeypatch.setattr(daemon, "TOKEN_FILE", state / "daemon.token")
+    monkeypatch.setattr(daemon, "DEFAULT_SOCKET", state / "mcp.sock")
+    return state
+
+
+@pytest.fixture(scope="module")
+def running(tmp_path_factory):
+    """A daemon serving on a Unix socket, with its own state directory."""
+    state = tmp_path_factory.mktemp("daemon")
+    env = {
+        **os.environ,
+        "GEMINI_MCP_STATE_DIR": str(state),
+        "PYTHONPATH": str(ROOT),
+    }
+    socket = str(state / "mcp.sock")
+    process = subprocess.Popen(
+        [sys.executable, str(COMBINED / "daemon.py"), "serve", "--socket", socket],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    address = Address(socket=socket)
+    deadline = time.monotonic() + 60
+    while health(address) is None:
+        assert process.poll() is None, "the daemon exited"
+        assert time.monotonic() < deadline, "the daemon did not start"
+        time.sleep(0.1)
+    try:
+        yield address, (state / "daemon.token").read_text().strip(), env
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def request(address: Address, method: str, path: str, headers=None, body=None):
+    conn = address.connect(10)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def test_addresses(state_dir: Path):
+    parser = argparse.ArgumentParser()
+    add_address_arguments(parser)
+
+    def address(*argv):
+        return address_from_args(parser.parse_args(argv))
+
+    assert address() == Address(socket=str(state_dir / "mcp.sock"))
+    assert address("--socket", "/run/x.sock") == Address(socket="/run/x.sock")
+    assert address("--port", "9000") == Address("127.0.0.1", 9000)
+    assert address("--port", "9000").url == "http://127.0.0.1:9000/mcp"
+
+
+def test_token_is_private_and_shared(state_dir: Path):
+    tokens = []
+    threads = [
+        threading.Thread(target=lambda: tokens.append(load_token())) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(tokens)) == 1
+    assert len(tokens[0]) >= 32
+    token_file = state_dir / "daemon.token"
+    assert stat.S_IMODE(token_file.stat().st_mode) == 0o600
+    assert stat.S_IMODE(state_dir.stat().st_mode) == 0o700
+    assert auth_headers() == {"Authorization": f"Bearer {tokens[0]}"}
+    # Only the token file is left behind.
+    assert [path.name for path in state_dir.iterdir()] == ["daemon.token"]
+
+
+def test_requests_need_the_token(running):
+    address, token, _ = running
+    body = json.dumps(INITIALIZE)
+
+    assert request(address, "GET", HEALTH_PATH)[0] == 200
+    assert request(address, "POST", MCP_PATH, HEADERS, body)[0] == 401
+    wrong = {**HEADERS, "Authorization": "Bearer not-the-token"}
+    assert request(address, "POST", MCP_PATH, wrong, body)[0] == 401
+    assert request(address, "GET", METRICS_PATH)[0] == 401
+
+    valid = {**HEADERS, "Authorization": f"Bearer {token}"}
+    status, payload = request(address, "POST", MCP_PATH, valid, body)
+    assert status == 200
+    assert json.loads(payload)["result"]["serverInfo"]
+    status, payload = request(address, "GET", METRICS_PATH, valid)
+    assert status == 200
+    assert b"mcp_calls_total" in payload
+
+
+def test_connect_forwards_stdio(running):
+    address, _, env = running
+    messages = [
+        INITIALIZE,
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        {"jsonrpc": "2.0", "id": 2, "method": "prompts/list"},
+    ]
+    result = subprocess.run(
+        [sys.executable, str(COMBINED / "connect.py"), "--socket", address.socket],
+        input="".join(json.dumps(message) + "\n" for message in messages),
+        capture_output=True,
+        text=True,
+        env=env,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    responses = {
+        response["id"]: response
+        for response in map(json.loads, result.stdout.splitlines())
+    }
+    assert sorted(responses) == [1, 2]
+    prompts = {prompt["name"] for prompt in responses[2]["result"]["prompts"]}
+    assert {"promptgen", "dynagent", "superagent"} <= prompts
@@ -0,0 +1,128 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from conftest import entry
+
+from gemini_cli_mcp import master_plan
+from gemini_cli_mcp.master_plan import PlanError, PlanFile
+from gemini_cli_mcp.session_log import SessionLog
+
+
+def test_steps_have_stable_ids(session_log: str):
+    plan = PlanFile(session_log).load()
+    assert [(step.id, step.done) for step in plan.walk()] == [
+        ("1", False),
+        ("2", False),
+        ("2.1", False),
+        ("3", False),
+    ]
+    assert plan.next_open().id == "1"
+
+
+def test_mark_done_changes_a_single_byte(session_log: str):
+    before = Path(session_log).read_bytes()
+    step = PlanFile(session_log).mark_done("2.1")
+    after = Path(session_log).read_bytes()
+    assert step.done
+    assert len(after) == len(before)
+    assert [i for i in range(len(before)) if before[i] != after[i]] == [step.box]
+    assert after[step.box - 1 : step.box + 2] == b"[x]"
+    # Marking it again is a no-op.
+    PlanFile(session_log).mark_done("2.1")
+    assert Path(session_log).read_bytes() == after
+
+
+def test_next_open_step_comes_after_substeps(session_log: str):
+    plan_file = PlanFile(session_log)
+    plan_file.mark_done("1")
+    assert plan_file.load().next_open().id == "2.1"
+    plan_file.mark_done("2.1")
+    assert plan_file.load().next_open().id == "2"
+
+
+def test_insert_substeps_after_existing_ones(session_log: str):
+    new = PlanFile(session_log).insert_substeps("2", ["Fix the bug", "Add a test"])
+    assert [step.id for step in new] == ["2.2", "2.3"]
+    assert "  - [ ] Step 2.1: Write the code\n" in Path(session_log).read_text()
+    assert (
+        "  - [ ] Step 2.2: Fix the bug\n  - [ ] Step 2.3: Add a test\n- [ ] Step 3"
+        in Path(session_log).read_text()
+    )
+    nested = PlanFile(session_log).insert_substeps("2.1", ["Nested"])
+    assert [(step.id, step.depth) for step in nested] == [("2.1.1", 2)]
+
+
+def test_insert_substeps_keeps_each_on_one_line(session_log: str):
+    (step,) = PlanFile(session_log).insert_substeps("1", ["fix it\nsecond line  "])
+    assert step.text == "Step 1.1: fix it second line"
+    assert [s.id for s in PlanFile(session_log).load().walk()][:2] == ["1", "1.1"]
+    with pytest.raises(PlanError):
+        PlanFile(session_log).insert_substeps("1", [" \n "])
+
+
+def test_unknown_step(session_log: str):
+    with pytest.raises(PlanError, match="No step"):
+        PlanFile(session_log).mark_done("9")
+
+
+def test_insert_keeps_the_turn_index_valid(session_log: str):
+    async def main():
+        log = SessionLog(session_log)
+        await log.append(entry(1))
+        await log.append(entry(2))
+        PlanFile(session_log).insert_substeps("3", ["A new substep"])
+        assert await log.append(entry(3)) == 3
+        return await log.read_turns()
+
+    turns = asyncio.run(main())
+    assert [turn.splitlines()[0] for turn in turns] == [
+        "### Turn 1: agent",
+        "### Turn 2: agent",
+        "### Turn 3: agent",
+    ]
+
+
+def test_later_inserts_leave_the_work_log_in_place(session_log: str, monkeypatch):
+    monkeypatch.setattr(master_plan, "PLAN_PADDING", 64)
+    asyncio.run(SessionLog(session_log).append(entry(1)))
+    plan_file = PlanFile(session_log)
+    plan_file.insert_substeps("1", ["Reserve the padding"])
+    before = Path(session_log).read_bytes()
+    work_log = before.index(b"---")
+
+    plan_file.insert_substeps("2", ["Fits"])
+    plan_file.insert_substeps("3", ["Fits too"])
+    after = Path(session_log).read_bytes()
+    assert len(after) == len(before)
+    assert after[work_log:] == before[work_log:]
+    assert [step.id for step in plan_file.load().walk()] == [
+        "1",
+        "1.1",
+        "2",
+        "2.1",
+        "2.2",
+        "3",
+        "3.1",
+    ]
+
+    # Once the padding is used up, the rest of the file moves again.
+    plan_file.insert_substeps("3", ["A substep too long for what is left"])
+    assert len(Path(session_log).read_bytes()) > len(after)
+    assert plan_file.load().find("3.2").text.startswith("Step 3.2: A substep")
+    turns = asyncio.run(SessionLog(session_log).read_turns())
+    assert [turn.splitlines()[0] for turn in turns] == ["### Turn 1: agent"]
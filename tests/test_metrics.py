@@ -0,0 +1,137 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import time
+
+import pytest
+from fastmcp import Client, FastMCP
+from fastmcp.exceptions import ToolError
+
+from gemini_cli_mcp.metrics import (
+    METRICS,
+    CallStats,
+    Metrics,
+    MetricsMiddleware,
+    SamplingProfiler,
+    add_metrics,
+)
+
+
+def server(metrics: Metrics) -> FastMCP:
+    mcp = FastMCP("test")
+    mcp.add_middleware(MetricsMiddleware(metrics))
+
+    @mcp.tool
+    def echo(text: str) -> str:
+        return text
+
+    @mcp.tool
+    def fail() -> str:
+        raise ToolError("no")
+
+    @mcp.prompt
+    def greet(name: str) -> str:
+        return f"Hello, {name}."
+
+    return mcp
+
+
+def test_quantiles():
+    stats = CallStats()
+    assert stats.latency_quantile(0.5) is None
+    for latency in [0.0004] * 90 + [2.0] * 9 + [1800.0]:
+        stats.record(latency, 0, 0)
+    assert stats.latency_quantile(0.5) == 0.0005
+    assert stats.latency_quantile(0.95) == 2.5
+    assert stats.latency_quantile(1.0) == 1800.0
+
+
+def test_latencies_past_the_last_bucket_stay_valid_json():
+    stats = CallStats()
+    stats.record(10 * 3600.0, 0, 0)
+    summary = stats.to_dict()
+    assert summary["latency_seconds"]["p99"] == "+Inf"
+    # Strict JSON, as MCP clients parse it.
+    json.loads(json.dumps(summary, allow_nan=False))
+
+
+def test_middleware_records_calls_errors_and_sizes():
+    metrics = Metrics()
+
+    async def main():
+        async with Client(server(metrics)) as client:
+            await client.call_tool("echo", {"text": "x" * 100})
+            await client.call_tool("echo", {"text": "é"})
+            with pytest.raises(ToolError):
+                await client.call_tool("fail", {})
+            await client.get_prompt("greet", {"name": "Ada"})
+
+    asyncio.run(main())
+    summary = metrics.summary()
+    echo = summary["tool"]["echo"]
+    assert echo["calls"] == 2
+    assert echo["errors"] == 0
+    assert echo["argument_bytes"] == {"total": 102, "max": 100}
+    assert echo["response_bytes"]["max"] >= 100
+    assert summary["tool"]["fail"]["errors"] == 1
+    assert summary["prompt"]["greet"]["calls"] == 1
+
+    text = metrics.prometheus()
+    assert 'mcp_calls_total{kind="tool",name="echo"} 2' in text
+    assert 'mcp_latency_seconds_bucket{kind="tool",name="echo",le="+Inf"} 2' in text
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+
+    async def main():
+        async with Client(server(metrics)) as client:
+            await client.call_tool("echo", {"text": "x"})
+
+    asyncio.run(main())
+    assert metrics.stats == {}
+
+
+def test_summary_resource():
+    mcp = FastMCP("test")
+    add_metrics(mcp)
+
+    @mcp.tool
+    def ping() -> str:
+        return "pong"
+
+    async def main():
+        async with Client(mcp) as client:
+            await client.call_tool("ping", {})
+            return await client.read_resource("metrics://summary")
+
+    contents = asyncio.run(main())
+    summary = json.loads(contents[0].text)
+    assert summary["tool"]["ping"]["calls"] >= 1
+    assert METRICS.stats[("tool", "ping")].calls >= 1
+
+
+def test_profiler_samples_other_threads():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not profiler.samples and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        profiler.toggle()
+    assert not profiler.running
+    assert "MainThread;" in profiler.collapsed()
@@ -0,0 +1,88 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from pathlib import Path
+
+import pytest
+
+from gemini_cli_mcp.prompt_templates import PromptTemplate
+
+
+def write(path: Path, text: str, mtime_ns: int) -> None:
+    path.write_text(text)
+    # Set the mtime explicitly so that rewrites within the file system's
+    # timestamp resolution are still seen as changes.
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def template_file(tmp_path: Path) -> Path:
+    path = tmp_path / "prompt.md"
+    write(path, "Task: {args}\n{{literal}}\n", 1_000_000_000)
+    return path
+
+
+def test_render(template_file: Path):
+    template = PromptTemplate(template_file)
+    assert template.render(args="fix it") == "Task: fix it\n{literal}\n"
+    assert PromptTemplate(template_file, strip=True).render(args="x") == (
+        "Task: x\n{literal}"
+    )
+    with pytest.raises(KeyError):
+        template.render(other="x")
+
+
+def test_unsupported_fields(tmp_path: Path):
+    path = tmp_path / "bad.md"
+    path.write_text("{args!r}")
+    with pytest.raises(ValueError, match="Unsupported template field"):
+        PromptTemplate(path).render(args="x")
+
+
+def test_reloads_when_the_file_changes(template_file: Path):
+    template = PromptTemplate(template_file)
+    assert template.render(args="a") == "Task: a\n{literal}\n"
+    # Same size, new mtime: the cached render must not be reused.
+    write(template_file, "Goal: {args}\n{{literal}}\n", 2_000_000_000)
+    assert template.render(args="a") == "Goal: a\n{literal}\n"
+
+
+def test_lru_is_bounded_by_entries(template_file: Path):
+    template = PromptTemplate(template_file, cache_size=2)
+    first = template.render(args="1")
+    template.render(args="2")
+    # Using "1" again makes "2" the least recently used.
+    assert template.render(args="1") is first
+    template.render(args="3")
+    assert len(template._renders) == 2
+    assert [key[-1] for key in template._renders] == [("args", "1"), ("args", "3")]
+
+
+def test_lru_is_bounded_by_bytes(template_file: Path):
+    template = PromptTemplate(template_file, cache_bytes=64 * 1024)
+    for i in range(20):
+        template.render(args=str(i) * 4000)
+    assert template._cached_bytes <= 64 * 1024
+    assert template._cached_bytes == sum(size for _, size in template._renders.values())
+    assert 0 < len(template._renders) < 20
+
+
+def test_large_renders_are_not_cached(template_file: Path):
+    template = PromptTemplate(template_file, cache_bytes=64 * 1024)
+    small = template.render(args="small")
+    huge = template.render(args="x" * (1 << 20))
+    assert huge.startswith("Task: xxx")
+    assert len(template._renders) == 1
+    assert template.render(args="small") is small
@@ -0,0 +1,198 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from conftest import entry, git
+
+from gemini_cli_mcp.result_cache import ResultCache, tree_state
+from gemini_cli_mcp.scheduler import SpecialistTask, run_batch
+from gemini_cli_mcp.session_log import SessionLog, TurnEntry
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> ResultCache:
+    return ResultCache(tmp_path / "cache")
+
+
+def specialist(
+    prompts: Path, script: str, session_log: str | None = None, name: str = "check"
+):
+    """A task whose prompt appends to `runs` each time it actually runs."""
+    runs = prompts / f"{name}.runs"
+    path = prompts / f"{name}.md"
+    path.write_text(f"echo run >> {runs}\n{script}\n")
+    return SpecialistTask(name, str(path), session_log=session_log), runs
+
+
+def run(task: SpecialistTask, cache: ResultCache, cwd: Path | None):
+    (result,) = asyncio.run(
+        run_batch([task], cwd=cwd and str(cwd), cache=cache, timeout=30)
+    )
+    return result
+
+
+def count(runs: Path) -> int:
+    return len(runs.read_text().splitlines()) if runs.exists() else 0
+
+
+def test_identical_run_is_served_from_the_cache(
+    stub_gemini: Path, git_repo: Path, cache: ResultCache
+):
+    task, runs = specialist(stub_gemini, "echo verified")
+    first = run(task, cache, git_repo)
+    second = run(task, cache, git_repo)
+    assert (first.cached, second.cached) == (False, True)
+    assert second.status == "COMPLETED"
+    assert second.stdout == first.stdout == "verified\n"
+    assert count(runs) == 1
+
+
+def test_changes_to_the_prompt_or_tree_miss(
+    stub_gemini: Path, git_repo: Path, cache: ResultCache
+):
+    task, runs = specialist(stub_gemini, "true")
+    run(task, cache, git_repo)
+    (git_repo / "untracked.txt").write_text("new\n")
+    assert not run(task, cache, git_repo).cached
+    (git_repo / "a.txt").write_text("changed\n")
+    assert not run(task, cache, git_repo).cached
+    assert run(task, cache, git_repo).cached
+    Path(task.prompt_file).write_text(Path(task.prompt_file).read_text() + "# v2\n")
+    assert not run(task, cache, git_repo).cached
+    assert count(runs) == 4
+
+
+def test_runs_that_change_the_tree_are_not_stored(
+    stub_gemini: Path, git_repo: Path, cache: ResultCache
+):
+    task, runs = specialist(stub_gemini, f"echo more >> {git_repo}/a.txt")
+    run(task, cache, git_repo)
+    git(git_repo, "checkout", "a.txt")
+    assert not run(task, cache, git_repo).cached
+    assert count(runs) == 2
+
+
+def test_failed_runs_are_not_stored(
+    stub_gemini: Path, git_repo: Path, cache: ResultCache
+):
+    task, runs = specialist(stub_gemini, "exit 1")
+    assert run(task, cache, git_repo).status == "FAILED"
+    assert run(task, cache, git_repo).status == "FAILED"
+    assert count(runs) == 2
+
+
+def test_nothing_is_cached_without_a_working_directory(
+    stub_gemini: Path, cache: ResultCache
+):
+    task, runs = specialist(stub_gemini, "true")
+    run(task, cache, None)
+    assert not run(task, cache, None).cached
+    assert count(runs) == 2
+
+
+def test_tree_state_writes_no_objects(git_repo: Path):
+    (git_repo / "untracked.txt").write_text("new\n")
+    (git_repo / "a.txt").write_text("changed\n")
+    objects = git(git_repo, "count-objects")
+    state = tree_state(str(git_repo))
+    assert tree_state(str(git_repo)) == state
+    assert git(git_repo, "count-objects") == objects
+    (git_repo / "untracked.txt").unlink()
+    assert tree_state(str(git_repo)) != state
+
+
+def test_tree_state_outside_git(tmp_path: Path):
+    directory = tmp_path / "plain"
+    directory.mkdir()
+    (directory / "file.txt").write_text("1")
+    state = tree_state(str(directory))
+    assert state.startswith("stat:")
+    (directory / "file.txt").write_text("22")
+    assert tree_state(str(directory)) != state
+
+
+def test_hit_replays_the_stored_turn(
+    stub_gemini: Path, git_repo: Path, cache: ResultCache, session_log: str
+):
+    # The specialist appends its own turn, as real specialists do.
+    task, runs = specialist(stub_gemini, "true", session_log=session_log)
+    key = cache.key(Path(task.prompt_file).read_bytes(), tree_state(str(git_repo)))
+    stored = entry(1)
+    stored.prompt = task.prompt_file
+    cache.put(
+        key,
+        Path(task.prompt_file).read_bytes(),
+        {"id": "x", "prompt_file": "x", "status": "COMPLETED", "exit_code": 0},
+        stored.render(1),
+    )
+
+    result = run(task, cache, git_repo)
+
+    assert result.cached and count(runs) == 0
+    (turn,) = asyncio.run(SessionLog(session_log).read_turns())
+    assert turn.startswith("### Turn 1: agent")
+    replayed = TurnEntry.parse(turn)
+    assert replayed.thought.startswith("Reused the result")
+    assert replayed.summary == stored.summary
+    assert result.log_entry.rstrip("\n") == turn
+
+
+def test_hit_with_a_missing_session_log_still_returns_the_result(
+    stub_gemini: Path, git_repo: Path, cache: ResultCache, tmp_path: Path
+):
+    moved = str(tmp_path / "moved" / "session.md")
+    task, runs = specialist(stub_gemini, "true", session_log=moved)
+    key = cache.key(Path(task.prompt_file).read_bytes(), tree_state(str(git_repo)))
+    cache.put(
+        key,
+        Path(task.prompt_file).read_bytes(),
+        {"id": "x", "prompt_file": "x", "status": "COMPLETED", "exit_code": 0},
+        entry(1).render(1),
+    )
+    other, _ = specialist(stub_gemini, "sleep 0.3", name="other")
+
+    results = asyncio.run(
+        run_batch([task, other], cwd=str(git_repo), cache=cache, timeout=30)
+    )
+
+    assert [(r.id, r.status) for r in results] == [
+        ("check", "COMPLETED"),
+        ("other", "COMPLETED"),
+    ]
+    assert results[0].cached and results[0].log_entry is None
+
+
+def test_prompts_are_deduplicated_and_evicted(tmp_path: Path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=1000)
+    preamble = b"Shared preamble.\n\n" * 1
+    prompts = [preamble + f"Task {i}.\n".encode() for i in range(3)]
+    for i, prompt in enumerate(prompts):
+        cache.put(f"k{i}", prompt, {"n": i}, None)
+    assert [cache.prompt(f"k{i}") for i in range(3)] == prompts
+    (blocks,) = cache._connect().execute("SELECT count(*) FROM blocks").fetchone()
+    assert blocks == 4
+
+    cache.put("big", b"x" * 900, {}, None)
+    assert cache.get("k0") is None
+    assert cache.get("big") == ({}, None)
+    assert cache.prompt("k0") is None
+
+
+def test_entries_expire(tmp_path: Path):
+    cache = ResultCache(tmp_path / "cache", max_age=0)
+    cache.put("k", b"prompt", {"n": 1}, None)
+    assert cache.get("k") is None
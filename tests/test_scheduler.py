@@ -0,0 +1,156 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from gemini_cli_mcp.scheduler import SpecialistTask, run_batch
+
+
+def prompt(directory: Path, name: str, script: str) -> str:
+    path = directory / f"{name}.md"
+    path.write_text(script)
+    return str(path)
+
+
+def run(tasks: list[SpecialistTask], **kwargs):
+    return asyncio.run(run_batch(tasks, **kwargs))
+
+
+def test_dependencies_run_first(stub_gemini: Path):
+    order = stub_gemini / "order"
+    tasks = [
+        SpecialistTask(
+            "b", prompt(stub_gemini, "b", f"echo b >> {order}"), depends_on=["a"]
+        ),
+        SpecialistTask("a", prompt(stub_gemini, "a", f"sleep 0.2; echo a >> {order}")),
+    ]
+    results = run(tasks)
+    assert [result.id for result in results] == ["b", "a"]
+    assert [result.status for result in results] == ["COMPLETED", "COMPLETED"]
+    assert order.read_text() == "a\nb\n"
+
+
+def test_independent_tasks_run_concurrently(stub_gemini: Path):
+    tasks = [
+        SpecialistTask(str(i), prompt(stub_gemini, str(i), "sleep 0.5"))
+        for i in range(4)
+    ]
+    results = run(tasks, max_concurrency=4)
+    assert all(result.status == "COMPLETED" for result in results)
+    # Run one after another, they would take at least 2 seconds.
+    assert max(result.duration for result in results) < 1.5
+
+
+def test_dependents_of_failed_task_are_skipped(stub_gemini: Path):
+    tasks = [
+        SpecialistTask("a", prompt(stub_gemini, "a", "echo oops >&2; exit 3")),
+        SpecialistTask("b", prompt(stub_gemini, "b", "true"), depends_on=["a"]),
+        SpecialistTask("c", prompt(stub_gemini, "c", "true"), depends_on=["b"]),
+        SpecialistTask("d", prompt(stub_gemini, "d", "echo fine")),
+    ]
+    a, b, c, d = run(tasks)
+    assert (a.status, a.exit_code, a.stderr) == ("FAILED", 3, "oops\n")
+    assert b.status == c.status == "SKIPPED"
+    assert (d.status, d.stdout) == ("COMPLETED", "fine\n")
+
+
+def test_timeout_stops_the_specialist(stub_gemini: Path):
+    marker = stub_gemini / "finished"
+    script = f"sleep 30; touch {marker}"
+    (result,) = run(
+        [SpecialistTask("a", prompt(stub_gemini, "a", script))], timeout=0.5
+    )
+    assert result.status == "TIMED_OUT"
+    assert result.duration < 10
+    assert not marker.exists()
+
+
+def test_fail_fast_cancels_the_rest(stub_gemini: Path):
+    tasks = [
+        SpecialistTask("a", prompt(stub_gemini, "a", "sleep 0.2; exit 1")),
+        SpecialistTask("b", prompt(stub_gemini, "b", "sleep 30")),
+        SpecialistTask("c", prompt(stub_gemini, "c", "true"), depends_on=["b"]),
+    ]
+    a, b, c = run(tasks, fail_fast=True)
+    assert a.status == "FAILED"
+    assert b.status == "CANCELLED"
+    assert b.duration < 10
+    assert c.status == "SKIPPED"
+
+
+def test_without_fail_fast_the_rest_completes(stub_gemini: Path):
+    tasks = [
+        SpecialistTask("a", prompt(stub_gemini, "a", "exit 1")),
+        SpecialistTask("b", prompt(stub_gemini, "b", "sleep 0.3")),
+    ]
+    a, b = run(tasks)
+    assert (a.status, b.status) == ("FAILED", "COMPLETED")
+
+
+def test_store_errors_do_not_cancel_the_batch(stub_gemini: Path):
+    class BrokenStore:
+        async def lookup(self, task, cwd):
+            if task.id == "a":
+                raise RuntimeError("lookup failed")
+            return "key", None
+
+        async def store(self, key, task, result, cwd):
+            raise RuntimeError("store failed")
+
+    tasks = [
+        SpecialistTask("a", prompt(stub_gemini, "a", "true")),
+        SpecialistTask("b", prompt(stub_gemini, "b", "sleep 0.3")),
+    ]
+    a, b = run(tasks, cache=BrokenStore())
+    assert (a.status, b.status) == ("COMPLETED", "COMPLETED")
+
+
+def test_result_callback_errors_do_not_cancel_the_batch(stub_gemini: Path):
+    async def on_result(result):
+        raise RuntimeError("report failed")
+
+    tasks = [
+        SpecialistTask("a", prompt(stub_gemini, "a", "true")),
+        SpecialistTask("b", prompt(stub_gemini, "b", "sleep 0.3")),
+    ]
+    a, b = run(tasks, on_result=on_result)
+    assert (a.status, b.status) == ("COMPLETED", "COMPLETED")
+
+
+@pytest.mark.parametrize(
+    "tasks, message",
+    [
+        ([SpecialistTask("a", "x"), SpecialistTask("a", "y")], "unique"),
+        ([SpecialistTask("a", "x", depends_on=["z"])], "unknown"),
+        (
+            [
+                SpecialistTask("a", "x", depends_on=["b"]),
+                SpecialistTask("b", "y", depends_on=["a"]),
+            ],
+            "cycle",
+        ),
+    ],
+)
+def test_invalid_batches_are_rejected(stub_gemini: Path, tasks, message):
+    with pytest.raises(ValueError, match=message):
+        run(tasks)
+
+
+def test_missing_gemini_is_reported(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        run([SpecialistTask("a", "x")])
@@ -0,0 +1,67 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import shutil
+from pathlib import Path
+
+import pytest
+from conftest import entry
+
+from gemini_cli_mcp.session_index import SessionIndex
+from gemini_cli_mcp.session_log import SessionLog
+
+
+@pytest.fixture
+def tasks_dir(tmp_path: Path, session_log: str) -> Path:
+    root = tmp_path / "tasks"
+    (root / "repo").mkdir(parents=True)
+    path = root / "repo" / "20250101-task.md"
+    shutil.copy(session_log, path)
+
+    async def main():
+        log = SessionLog(str(path))
+        first = entry(1)
+        first.observation = "The connection pool timed out."
+        await log.append(first)
+        await log.append(entry(2, "FAILED"))
+
+    asyncio.run(main())
+    (root / "repo" / "prompt-migrate.md").write_text("Migrate the schema.\n")
+    return root
+
+
+def test_search_finds_turns_and_prompts(tasks_dir: Path):
+    index = SessionIndex(tasks_dir, refresh_interval=0)
+    (hit,) = index.search('"connection pool" AND timed')
+    assert (hit["turn"], hit["status"], hit["kind"]) == (1, "COMPLETED", "session_log")
+    assert "**connection pool**" in hit["snippet"]
+    (prompt,) = index.search("migrat*", kind="prompt")
+    assert prompt["path"].endswith("prompt-migrate.md")
+    assert [hit["turn"] for hit in index.search("Summary", status="FAILED")] == [2]
+
+
+def test_queries_that_are_not_fts5(tasks_dir: Path):
+    index = SessionIndex(tasks_dir, refresh_interval=0)
+    assert index.search("***") == []
+    assert [hit["turn"] for hit in index.search('pool" (')] == [1]
+
+
+def test_index_follows_changes(tasks_dir: Path):
+    index = SessionIndex(tasks_dir, refresh_interval=0)
+    assert index.search("schema")
+    (tasks_dir / "repo" / "prompt-migrate.md").unlink()
+    assert index.search("schema") == []
+    (session,) = index.list_sessions()
+    assert (session["turns"], session["last_status"]) == (2, "FAILED")
@@ -0,0 +1,90 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from conftest import entry
+
+from gemini_cli_mcp.session_log import SessionLog, locked
+from gemini_cli_mcp.turn_index import TurnIndex, index_path
+
+
+def append(path: str, statuses: list[str]) -> None:
+    async def main():
+        log = SessionLog(path)
+        for i, status in enumerate(statuses):
+            await log.append(entry(i, status))
+
+    asyncio.run(main())
+
+
+def turns(path: str, **kwargs) -> list[int]:
+    with locked(path) as fd, TurnIndex(path).lookup(fd) as view:
+        return [view._record(i)[1] for i in view.positions(**kwargs)]
+
+
+def test_positions(session_log: str):
+    append(session_log, ["COMPLETED", "FAILED", "COMPLETED", "FAILED"])
+    assert turns(session_log) == [1, 2, 3, 4]
+    assert turns(session_log, start=2, end=3) == [2, 3]
+    assert turns(session_log, status="FAILED") == [2, 4]
+    assert turns(session_log, start=3, status="FAILED") == [4]
+    assert turns(session_log, start=5) == []
+    with locked(session_log) as fd, TurnIndex(session_log).lookup(fd) as view:
+        assert isinstance(view.positions(), range)
+
+
+def test_catch_up(session_log: str, monkeypatch):
+    append(session_log, ["COMPLETED"] * 2)
+    monkeypatch.setattr(
+        TurnIndex, "_rebuild", lambda *args: pytest.fail("the index was rebuilt")
+    )
+    # An append that did not go through SessionLog, e.g. by an older client.
+    with open(session_log, "a") as f:
+        f.write("\n" + entry(3, "FAILED").render(3))
+    assert turns(session_log) == [1, 2, 3]
+    assert turns(session_log, status="FAILED") == [3]
+    append(session_log, ["COMPLETED"])
+    assert turns(session_log) == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [
+        lambda idx: idx.unlink(),
+        lambda idx: idx.write_bytes(b"garbage"),
+        lambda idx: idx.write_bytes(idx.read_bytes()[:-4]),
+    ],
+    ids=["missing", "corrupt", "truncated"],
+)
+def test_damaged_index_is_rebuilt(session_log: str, damage):
+    append(session_log, ["COMPLETED", "FAILED", "COMPLETED"])
+    damage(Path(index_path(session_log)))
+    assert turns(session_log) == [1, 2, 3]
+    assert turns(session_log, status="FAILED") == [2]
+
+
+def test_rewrite_that_moves_turns_is_rebuilt(session_log: str):
+    append(session_log, ["COMPLETED"] * 3)
+    text = Path(session_log).read_text()
+    # The strategist rewrites the file with a longer heading, so every turn
+    # moves and the log still grows.
+    Path(session_log).write_text(
+        text.replace("# Task: Example", "# Task: A longer example")
+    )
+    assert turns(session_log) == [1, 2, 3]
+    with locked(session_log) as fd, TurnIndex(session_log).lookup(fd) as view:
+        assert view.text(0).startswith("### Turn 1: agent\n")